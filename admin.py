@@ -1,5 +1,18 @@
-from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for
-from database import Session, Reserva, Cliente, Cancha
+from flask import Blueprint, Response, render_template, request, jsonify, session, redirect, url_for
+from database import obtener_sesion, obtener_sesion_lectura, marcar_escritura, enrutador, estado_pool, Reserva, ResumenDiario, Cliente, Cancha, ESTADOS_ACTIVOS, indice_horario_activo, es_violacion_unica
+from sqlalchemy import Integer, any_, bindparam, exists, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from cache import cache_dashboard, cache_disponibilidad
+from cambios import Cambio, registrar_cambio, registrar_cambios
+from notificaciones import encolar_cambio_estado
+from tareas import cola_tareas
+from catalogo import catalogo_canchas
+from vencimiento import PENDIENTE_TTL_MINUTOS, ultimas_pasadas, vencer_pendientes
+from retencion import RETENCION_DIAS, RETENCION_LOTE, purgar_reservas_antiguas
+from reportes import AGRUPACIONES, FUENTES, expresion_ingresos, lineas_csv, reporte
+from respaldo import TABLAS, comprimir_gzip, exportar_tabla, lineas_ndjson
 from datetime import datetime, date, timedelta
 import json
 
@@ -34,51 +47,183 @@ def check_admin():
         return redirect('/admin')
     return None
 
+def _consulta_contadores_dashboard(session_db):
+    """Todos los contadores en un solo recorrido sobre resumen_diario"""
+    def suma(columna, *condicion):
+        total = func.sum(columna)
+        if condicion:
+            total = total.filter(*condicion)
+        return func.coalesce(total, 0)
+    
+    return session_db.query(
+        suma(ResumenDiario.reservas),
+        suma(ResumenDiario.reservas, ResumenDiario.fecha == date.today()),
+        suma(ResumenDiario.pendientes),
+        suma(ResumenDiario.confirmadas)
+    )
+
+def _consulta_ultimas_reservas(session_db, limite=5):
+    return session_db.query(Reserva).options(
+        joinedload(Reserva.cliente),
+        joinedload(Reserva.cancha)
+    ).order_by(Reserva.fecha_creacion.desc()).limit(limite)
+
+def _estadisticas_dashboard(session_db):
+    """Contadores y últimas reservas del dashboard en dos consultas"""
+    contadores = _consulta_contadores_dashboard(session_db).one()
+    
+    # Últimas 5 reservas
+    ultimas_reservas = _consulta_ultimas_reservas(session_db).all()
+    
+    # Preparar datos para las últimas reservas
+    reservas_data = []
+    for reserva in ultimas_reservas:
+        reservas_data.append({
+            'id': reserva.id,
+            'cliente': f"{reserva.cliente.nombre} {reserva.cliente.apellido}",
+            'cancha': reserva.cancha.nombre,
+            'fecha': reserva.fecha_reserva.strftime('%d/%m/%Y'),
+            'horario': reserva.horario,
+            'estado': reserva.estado,
+            'monto': reserva.monto_total
+        })
+    
+    return {
+        'total_reservas': contadores[0],
+        'reservas_hoy': contadores[1],
+        'reservas_pendientes': contadores[2],
+        'reservas_confirmadas': contadores[3],
+        'ultimas_reservas': reservas_data
+    }
+
 @admin_blueprint.route('/dashboard')
 def dashboard():
     redirect_response = check_admin()
     if redirect_response:
         return redirect_response
     
-    session_db = Session()
+    calcular = lambda: _estadisticas_dashboard(obtener_sesion_lectura())
+    if cache_dashboard.ttl:
+        # Varios admins refrescando cuestan una consulta por intervalo
+        estadisticas = cache_dashboard.obtener_o_calcular(date.today(), calcular)
+    else:
+        estadisticas = calcular()
+    
+    return render_template('admin_dashboard.html', **estadisticas)
+
+# Tamaño de página del listado de reservas
+RESERVAS_POR_PAGINA = 50
+MAX_RESERVAS_POR_PAGINA = 200
+
+# Estados desde los que se puede pasar a cada estado (los mismos botones del listado)
+TRANSICIONES = {
+    'confirmada': ('pendiente',),
+    'completada': ('confirmada',),
+    'cancelada': ('pendiente', 'confirmada'),
+    'pendiente': ('completada', 'cancelada'),
+}
+
+# Ids por pedido de /actualizar_estado_lote
+MAX_IDS_LOTE = 500
+
+def _parsear_fecha(valor):
     try:
-        # Estadísticas para el dashboard
-        total_reservas = session_db.query(Reserva).count()
-        
-        reservas_hoy = session_db.query(Reserva).filter(
-            Reserva.fecha_reserva >= date.today(),
-            Reserva.fecha_reserva < date.today() + timedelta(days=1)
-        ).count()
-        
-        reservas_pendientes = session_db.query(Reserva).filter_by(estado='pendiente').count()
-        reservas_confirmadas = session_db.query(Reserva).filter_by(estado='confirmada').count()
-        
-        # Últimas 5 reservas
-        ultimas_reservas = session_db.query(Reserva).order_by(Reserva.fecha_creacion.desc()).limit(5).all()
-        
-        # Preparar datos para las últimas reservas
-        reservas_data = []
-        for reserva in ultimas_reservas:
-            cliente = session_db.query(Cliente).get(reserva.cliente_id)
-            cancha = session_db.query(Cancha).get(reserva.cancha_id)
-            reservas_data.append({
-                'id': reserva.id,
-                'cliente': f"{cliente.nombre} {cliente.apellido}",
-                'cancha': cancha.nombre,
-                'fecha': reserva.fecha_reserva.strftime('%d/%m/%Y'),
-                'horario': reserva.horario,
-                'estado': reserva.estado,
-                'monto': reserva.monto_total
-            })
-        
-        return render_template('admin_dashboard.html',
-                             total_reservas=total_reservas,
-                             reservas_hoy=reservas_hoy,
-                             reservas_pendientes=reservas_pendientes,
-                             reservas_confirmadas=reservas_confirmadas,
-                             ultimas_reservas=reservas_data)
-    finally:
-        session_db.close()
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+def _filtros_reservas(args):
+    """Lee los filtros del listado desde los parámetros de la petición"""
+    filtros = {
+        'estado': args.get('estado', 'todas'),
+        'cancha_id': args.get('cancha_id', type=int),
+        'metodo_pago': args.get('metodo_pago', ''),
+        'desde': args.get('desde', ''),
+        'hasta': args.get('hasta', ''),
+        'fecha': args.get('fecha', '')
+    }
+    # 'fecha' equivale a un rango de un solo día
+    if filtros['fecha'] and not (filtros['desde'] or filtros['hasta']):
+        filtros['desde'] = filtros['hasta'] = filtros['fecha']
+    return filtros
+
+def _decodificar_cursor(cursor):
+    """El cursor es '<fecha_reserva ISO>,<id>' de la última fila entregada"""
+    try:
+        fecha, reserva_id = cursor.rsplit(',', 1)
+        return datetime.fromisoformat(fecha), int(reserva_id)
+    except (AttributeError, ValueError):
+        return None
+
+def _condiciones_filtros(filtros):
+    """Condiciones WHERE de los filtros del listado"""
+    condiciones = []
+    if filtros['estado'] != 'todas':
+        condiciones.append(Reserva.estado == filtros['estado'])
+    if filtros['cancha_id']:
+        condiciones.append(Reserva.cancha_id == filtros['cancha_id'])
+    if filtros['metodo_pago']:
+        condiciones.append(Reserva.metodo_pago == filtros['metodo_pago'])
+    
+    desde = _parsear_fecha(filtros['desde'])
+    if desde:
+        condiciones.append(Reserva.fecha_reserva >= desde)
+    hasta = _parsear_fecha(filtros['hasta'])
+    if hasta:
+        condiciones.append(Reserva.fecha_reserva < hasta + timedelta(days=1))
+    return condiciones
+
+def _consulta_pagina_reservas(session_db, filtros, cursor=None, limite=RESERVAS_POR_PAGINA):
+    """Consulta de una página del listado (trae una fila extra para saber si hay más)"""
+    query = session_db.query(Reserva).options(
+        joinedload(Reserva.cliente),
+        joinedload(Reserva.cancha)
+    ).filter(*_condiciones_filtros(filtros))
+    
+    posicion = _decodificar_cursor(cursor)
+    if posicion:
+        query = query.filter(tuple_(Reserva.fecha_reserva, Reserva.id) < tuple_(*posicion))
+    
+    return query.order_by(
+        Reserva.fecha_reserva.desc(),
+        Reserva.id.desc()
+    ).limit(limite + 1)
+
+def _consultar_pagina_reservas(session_db, filtros, cursor=None, limite=RESERVAS_POR_PAGINA):
+    """Página de reservas ordenada por (fecha_reserva, id) descendente.
+
+    Usa paginación por clave: la página siguiente arranca después de la
+    última fila vista, así el costo no crece con la profundidad.
+    Devuelve (reservas, siguiente_cursor).
+    """
+    reservas = _consulta_pagina_reservas(session_db, filtros, cursor, limite).all()
+    
+    siguiente_cursor = None
+    if len(reservas) > limite:
+        reservas = reservas[:limite]
+        ultima = reservas[-1]
+        siguiente_cursor = f"{ultima.fecha_reserva.isoformat()},{ultima.id}"
+    
+    return reservas, siguiente_cursor
+
+def _reserva_a_dict(reserva):
+    return {
+        'id': reserva.id,
+        'cliente_nombre': f"{reserva.cliente.nombre} {reserva.cliente.apellido}",
+        'cliente_telefono': reserva.cliente.telefono,
+        'cancha_nombre': reserva.cancha.nombre,
+        'cancha_tipo': reserva.cancha.tipo,
+        'fecha_reserva': reserva.fecha_reserva.strftime('%d/%m/%Y'),
+        'horario': reserva.horario,
+        'estado': reserva.estado,
+        'metodo_pago': reserva.metodo_pago,
+        'monto': reserva.monto_total,
+        'fecha_creacion': reserva.fecha_creacion.strftime('%d/%m/%Y %H:%M')
+    }
+
+def _limite_pagina():
+    limite = request.args.get('limite', RESERVAS_POR_PAGINA, type=int)
+    return max(1, min(limite, MAX_RESERVAS_POR_PAGINA))
 
 @admin_blueprint.route('/reservas')
 def gestion_reservas():
@@ -86,56 +231,38 @@ def gestion_reservas():
     if redirect_response:
         return redirect_response
     
-    session_db = Session()
-    try:
-        # Obtener parámetros de filtro
-        estado = request.args.get('estado', 'todas')
-        fecha = request.args.get('fecha', '')
-        
-        # Construir query base
-        query = session_db.query(Reserva)
-        
-        # Aplicar filtros
-        if estado != 'todas':
-            query = query.filter(Reserva.estado == estado)
-        
-        if fecha:
-            try:
-                fecha_filtro = datetime.strptime(fecha, '%Y-%m-%d').date()
-                query = query.filter(
-                    Reserva.fecha_reserva >= fecha_filtro,
-                    Reserva.fecha_reserva < fecha_filtro + timedelta(days=1)
-                )
-            except:
-                pass
-        
-        reservas = query.order_by(Reserva.fecha_reserva.desc()).all()
-        
-        # Preparar datos para la tabla
-        reservas_data = []
-        for reserva in reservas:
-            cliente = session_db.query(Cliente).get(reserva.cliente_id)
-            cancha = session_db.query(Cancha).get(reserva.cancha_id)
-            reservas_data.append({
-                'id': reserva.id,
-                'cliente_nombre': f"{cliente.nombre} {cliente.apellido}",
-                'cliente_telefono': cliente.telefono,
-                'cancha_nombre': cancha.nombre,
-                'cancha_tipo': cancha.tipo,
-                'fecha_reserva': reserva.fecha_reserva.strftime('%d/%m/%Y'),
-                'horario': reserva.horario,
-                'estado': reserva.estado,
-                'metodo_pago': reserva.metodo_pago,
-                'monto': reserva.monto_total,
-                'fecha_creacion': reserva.fecha_creacion.strftime('%d/%m/%Y %H:%M')
-            })
-        
-        return render_template('admin_reservas.html', 
-                             reservas=reservas_data,
-                             filtro_estado=estado,
-                             filtro_fecha=fecha)
-    finally:
-        session_db.close()
+    session_db = obtener_sesion_lectura()
+    filtros = _filtros_reservas(request.args)
+    reservas, siguiente_cursor = _consultar_pagina_reservas(
+        session_db, filtros, request.args.get('cursor'), _limite_pagina()
+    )
+    canchas = catalogo_canchas.todas(session_db)
+    
+    return render_template('admin_reservas.html', 
+                         reservas=[_reserva_a_dict(r) for r in reservas],
+                         siguiente_cursor=siguiente_cursor,
+                         canchas=canchas,
+                         filtros=filtros,
+                         filtro_estado=filtros['estado'],
+                         filtro_fecha=filtros['fecha'])
+
+@admin_blueprint.route('/reservas/datos')
+def gestion_reservas_datos():
+    """Variante JSON del listado para cargar más filas bajo demanda"""
+    redirect_response = check_admin()
+    if redirect_response:
+        return jsonify({'success': False, 'error': 'No autorizado'})
+    
+    session_db = obtener_sesion_lectura()
+    filtros = _filtros_reservas(request.args)
+    reservas, siguiente_cursor = _consultar_pagina_reservas(
+        session_db, filtros, request.args.get('cursor'), _limite_pagina()
+    )
+    return jsonify({
+        'success': True,
+        'reservas': [_reserva_a_dict(r) for r in reservas],
+        'siguiente_cursor': siguiente_cursor
+    })
 
 @admin_blueprint.route('/actualizar_estado', methods=['POST'])
 def actualizar_estado():
@@ -147,20 +274,211 @@ def actualizar_estado():
     reserva_id = data.get('reserva_id')
     nuevo_estado = data.get('nuevo_estado')
     
-    session_db = Session()
+    if nuevo_estado not in TRANSICIONES:
+        return jsonify({'success': False, 'error': 'Estado inválido'})
+    
+    session_db = obtener_sesion()
     try:
-        reserva = session_db.query(Reserva).get(reserva_id)
-        if reserva:
-            reserva.estado = nuevo_estado
-            session_db.commit()
-            return jsonify({'success': True, 'mensaje': 'Estado actualizado correctamente'})
-        else:
+        actual = session_db.execute(select(Reserva.estado).where(Reserva.id == reserva_id)).first()
+        if actual is None:
             return jsonify({'success': False, 'error': 'Reserva no encontrada'})
+        estado_anterior = actual.estado
+        if nuevo_estado == estado_anterior:
+            return jsonify({'success': True, 'mensaje': 'Estado actualizado correctamente'})
+        if estado_anterior not in TRANSICIONES[nuevo_estado]:
+            return jsonify({'success': False, 'error': f'No se puede pasar de {estado_anterior} a {nuevo_estado}'})
+        
+        # Sólo si sigue en el estado leído: con dos administradores (o el
+        # vencimiento) a la vez, cada uno restaría del resumen el mismo estado
+        fila = session_db.execute(_consulta_cambio_estado(
+            [Reserva.id == reserva_id, Reserva.estado == estado_anterior], nuevo_estado
+        )).first()
+        if fila is None:
+            session_db.rollback()
+            return jsonify({'success': False, 'error': 'La reserva cambió de estado mientras tanto; actualice la página'})
+        registrar_cambio(session_db, fila.cancha_id, fila.fecha_reserva,
+                         estado_anterior, nuevo_estado, fila.monto_total, fila.horario, fila.id)
+        encolar_cambio_estado(session_db, fila.id, nuevo_estado)
+        session_db.commit()
+        marcar_escritura()
+        return jsonify({'success': True, 'mensaje': 'Estado actualizado correctamente'})
+    except IntegrityError as e:
+        session_db.rollback()
+        if es_violacion_unica(e, indice_horario_activo):
+            return jsonify({'success': False, 'error': 'Este horario ya está reservado'})
+        return jsonify({'success': False, 'error': str(e)})
+    except Exception as e:
+        session_db.rollback()
+        return jsonify({'success': False, 'error': str(e)})
+
+def _filtros_lote(filtro):
+    """Filtros de un cambio masivo: a diferencia del listado, un valor
+    inválido o una clave desconocida es un error y no se ignora, porque
+    ignorarlo ampliaría el conjunto de reservas a modificar.
+    Devuelve (filtros, error)."""
+    desconocidas = set(filtro) - {'estado', 'cancha_id', 'metodo_pago', 'fecha', 'desde', 'hasta'}
+    if desconocidas:
+        return None, f"Filtro desconocido: {', '.join(sorted(desconocidas))}"
+    for clave, valor in filtro.items():
+        if valor is None or not str(valor).strip():
+            return None, f"Filtro vacío: {clave}"
+    if 'estado' in filtro and filtro['estado'] not in TRANSICIONES:
+        return None, f"Estado inválido: {filtro['estado']}"
+    if 'cancha_id' in filtro:
+        try:
+            filtro = {**filtro, 'cancha_id': int(filtro['cancha_id'])}
+        except (TypeError, ValueError):
+            return None, 'cancha_id inválido'
+    for clave in ('fecha', 'desde', 'hasta'):
+        if clave in filtro and _parsear_fecha(filtro[clave]) is None:
+            return None, f'Fecha inválida en {clave} (formato AAAA-MM-DD)'
+    
+    filtros = {'estado': 'todas', 'cancha_id': None, 'metodo_pago': '', 'desde': '', 'hasta': '', **filtro}
+    if 'fecha' in filtro:
+        if 'desde' in filtro or 'hasta' in filtro:
+            return None, "Usar 'fecha' o 'desde'/'hasta', no ambos"
+        filtros['desde'] = filtros['hasta'] = filtro['fecha']
+    return filtros, None
+
+def _id_en(session_db, ids):
+    """id = ANY(:ids) en PostgreSQL (un solo parámetro, la misma sentencia
+    para cualquier cantidad de ids); IN (...) en los demás motores"""
+    if session_db.get_bind().dialect.name == 'postgresql':
+        return Reserva.id == any_(bindparam('ids', list(ids), type_=ARRAY(Integer)))
+    return Reserva.id.in_(ids)
+
+def _consulta_cambio_estado(condiciones, nuevo_estado):
+    """UPDATE ... RETURNING de las reservas que cumplen 'condiciones'"""
+    return (
+        update(Reserva).where(*condiciones).values(estado=nuevo_estado)
+        .returning(Reserva.id, Reserva.cancha_id, Reserva.fecha_reserva, Reserva.horario, Reserva.monto_total)
+    )
+
+def _cambiar_estados(session_db, condiciones, nuevo_estado):
+    """Pasa a 'nuevo_estado' las reservas que cumplen 'condiciones' y están en
+    un estado de origen permitido. Un UPDATE ... RETURNING por estado de
+    origen, así se conoce el anterior de cada fila sin leerla antes.
+    Devuelve (cambiadas, ocupadas): filas actualizadas e ids que no se
+    reactivaron porque su horario ya está tomado."""
+    cambiadas = []
+    ocupadas = []
+    for estado_anterior in TRANSICIONES[nuevo_estado]:
+        filtro = [*condiciones, Reserva.estado == estado_anterior]
+        if nuevo_estado in ESTADOS_ACTIVOS and estado_anterior not in ESTADOS_ACTIVOS:
+            # Reactivar sólo si nadie más tomó el turno mientras tanto
+            otra = Reserva.__table__.alias('otra')
+            tomado = exists().where(
+                otra.c.cancha_id == Reserva.cancha_id,
+                otra.c.fecha_reserva == Reserva.fecha_reserva,
+                otra.c.horario == Reserva.horario,
+                otra.c.estado.in_(ESTADOS_ACTIVOS),
+                otra.c.id != Reserva.id
+            )
+            ocupadas.extend(session_db.scalars(select(Reserva.id).where(*filtro, tomado)))
+            filtro.append(~tomado)
+        filas = session_db.execute(_consulta_cambio_estado(filtro, nuevo_estado)).all()
+        cambiadas.extend((fila, estado_anterior) for fila in filas)
+    
+    registrar_cambios(session_db, [
+        Cambio(fila.cancha_id, fila.fecha_reserva, estado_anterior, nuevo_estado, fila.monto_total, fila.horario, fila.id)
+        for fila, estado_anterior in cambiadas
+    ])
+    for fila, _ in cambiadas:
+        encolar_cambio_estado(session_db, fila.id, nuevo_estado)
+    return cambiadas, ocupadas
+
+@admin_blueprint.route('/actualizar_estado_lote', methods=['POST'])
+def actualizar_estado_lote():
+    """Cambia el estado de varias reservas en una transacción.
+
+    Recibe 'nuevo_estado' y 'ids' (lista) o 'filtro' (los mismos filtros del
+    listado: estado, cancha_id, metodo_pago, fecha, desde, hasta). Con ids,
+    devuelve el resultado de cada uno.
+    """
+    redirect_response = check_admin()
+    if redirect_response:
+        return jsonify({'success': False, 'error': 'No autorizado'})
+    
+    data = request.get_json(silent=True) or {}
+    nuevo_estado = data.get('nuevo_estado')
+    if nuevo_estado not in TRANSICIONES:
+        return jsonify({'success': False, 'error': 'Estado inválido'}), 400
+    
+    session_db = obtener_sesion()
+    ids = None
+    if data.get('ids') is not None:
+        try:
+            ids = list(dict.fromkeys(int(reserva_id) for reserva_id in data['ids']))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'Ids inválidos'}), 400
+        if not ids:
+            return jsonify({'success': False, 'error': 'No se indicaron reservas'}), 400
+        if len(ids) > MAX_IDS_LOTE:
+            return jsonify({'success': False, 'error': f'Máximo {MAX_IDS_LOTE} reservas por pedido'}), 400
+        condiciones = [_id_en(session_db, ids)]
+    elif isinstance(data.get('filtro'), dict):
+        filtros, error = _filtros_lote(data['filtro'])
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        condiciones = _condiciones_filtros(filtros)
+        # Sin ningún filtro se cambiarían todas las reservas
+        if not condiciones:
+            return jsonify({'success': False, 'error': 'El filtro no puede estar vacío'}), 400
+    else:
+        return jsonify({'success': False, 'error': "Se requiere 'ids' o 'filtro'"}), 400
+    
+    try:
+        cambiadas, ocupadas = _cambiar_estados(session_db, condiciones, nuevo_estado)
+        session_db.commit()
+        marcar_escritura()
+    except IntegrityError as e:
+        session_db.rollback()
+        if es_violacion_unica(e, indice_horario_activo):
+            # Dos reservas del lote reactivan el mismo horario
+            return jsonify({'success': False, 'error': 'Hay reservas del lote con el mismo horario'})
+        return jsonify({'success': False, 'error': str(e)})
     except Exception as e:
         session_db.rollback()
         return jsonify({'success': False, 'error': str(e)})
-    finally:
-        session_db.close()
+    
+    resultados = {
+        fila.id: {'id': fila.id, 'resultado': 'actualizada', 'estado_anterior': estado_anterior}
+        for fila, estado_anterior in cambiadas
+    }
+    if ids is not None:
+        for reserva_id in ocupadas:
+            resultados[reserva_id] = {'id': reserva_id, 'resultado': 'horario_ocupado'}
+        faltantes = [reserva_id for reserva_id in ids if reserva_id not in resultados]
+        actuales = dict(session_db.execute(
+            select(Reserva.id, Reserva.estado).where(_id_en(session_db, faltantes))
+        ).all()) if faltantes else {}
+        for reserva_id in faltantes:
+            estado = actuales.get(reserva_id)
+            if estado is None:
+                resultados[reserva_id] = {'id': reserva_id, 'resultado': 'no_encontrada'}
+            elif estado == nuevo_estado:
+                resultados[reserva_id] = {'id': reserva_id, 'resultado': 'sin_cambios', 'estado': estado}
+            else:
+                resultados[reserva_id] = {'id': reserva_id, 'resultado': 'transicion_invalida', 'estado': estado}
+        resultados = [resultados[reserva_id] for reserva_id in ids]
+    else:
+        resultados = list(resultados.values())
+    
+    return jsonify({
+        'success': True,
+        'nuevo_estado': nuevo_estado,
+        'actualizadas': len(cambiadas),
+        'resultados': resultados
+    })
+
+def _consulta_reservas_dia(session_db, fecha):
+    return session_db.query(Reserva).options(
+        joinedload(Reserva.cliente),
+        joinedload(Reserva.cancha)
+    ).filter(
+        Reserva.fecha_reserva >= fecha,
+        Reserva.fecha_reserva < fecha + timedelta(days=1)
+    )
 
 @admin_blueprint.route('/reporte_diario')
 def reporte_diario():
@@ -168,61 +486,103 @@ def reporte_diario():
     if redirect_response:
         return redirect_response
     
-    session_db = Session()
+    session_db = obtener_sesion_lectura()
+    fecha_reporte = request.args.get('fecha', date.today().isoformat())
+    
     try:
-        fecha_reporte = request.args.get('fecha', date.today().isoformat())
-        
-        try:
-            fecha = datetime.strptime(fecha_reporte, '%Y-%m-%d').date()
-        except:
-            fecha = date.today()
-        
-        # Obtener reservas del día
-        reservas_dia = session_db.query(Reserva).filter(
-            Reserva.fecha_reserva >= fecha,
-            Reserva.fecha_reserva < fecha + timedelta(days=1)
-        ).all()
-        
-        # Calcular estadísticas
-        total_reservas = len(reservas_dia)
-        ingresos_totales = sum(r.monto_total or 0 for r in reservas_dia if r.estado in ['confirmada', 'completada'])
-        
-        reservas_por_estado = {}
-        for reserva in reservas_dia:
-            reservas_por_estado[reserva.estado] = reservas_por_estado.get(reserva.estado, 0) + 1
-        
-        # Preparar datos detallados
-        reservas_detalle = []
-        for reserva in reservas_dia:
-            cliente = session_db.query(Cliente).get(reserva.cliente_id)
-            cancha = session_db.query(Cancha).get(reserva.cancha_id)
-            reservas_detalle.append({
-                'id': reserva.id,
-                'cliente': f"{cliente.nombre} {cliente.apellido}",
-                'cancha': cancha.nombre,
-                'horario': reserva.horario,
-                'estado': reserva.estado,
-                'metodo_pago': reserva.metodo_pago,
-                'monto': reserva.monto_total
-            })
-        
-        return jsonify({
-            'fecha': fecha.isoformat(),
-            'total_reservas': total_reservas,
-            'ingresos_totales': ingresos_totales,
-            'reservas_por_estado': reservas_por_estado,
-            'reservas_detalle': reservas_detalle
+        fecha = datetime.strptime(fecha_reporte, '%Y-%m-%d').date()
+    except:
+        fecha = date.today()
+    
+    del_dia = [
+        Reserva.fecha_reserva >= fecha,
+        Reserva.fecha_reserva < fecha + timedelta(days=1)
+    ]
+    
+    # Calcular estadísticas en la base de datos
+    por_estado = session_db.query(
+        Reserva.estado,
+        func.count(Reserva.id),
+        expresion_ingresos(Reserva.monto_total)
+    ).filter(*del_dia).group_by(Reserva.estado).all()
+    
+    reservas_por_estado = {estado: cantidad for estado, cantidad, _ in por_estado}
+    total_reservas = sum(reservas_por_estado.values())
+    ingresos_totales = sum(ingresos for _, _, ingresos in por_estado)
+    
+    # Obtener reservas del día
+    reservas_dia = _consulta_reservas_dia(session_db, fecha).all()
+    
+    # Preparar datos detallados
+    reservas_detalle = []
+    for reserva in reservas_dia:
+        reservas_detalle.append({
+            'id': reserva.id,
+            'cliente': f"{reserva.cliente.nombre} {reserva.cliente.apellido}",
+            'cancha': reserva.cancha.nombre,
+            'horario': reserva.horario,
+            'estado': reserva.estado,
+            'metodo_pago': reserva.metodo_pago,
+            'monto': reserva.monto_total
         })
-    finally:
-        session_db.close()
-        
+    
+    return jsonify({
+        'fecha': fecha.isoformat(),
+        'total_reservas': total_reservas,
+        'ingresos_totales': ingresos_totales,
+        'reservas_por_estado': reservas_por_estado,
+        'reservas_detalle': reservas_detalle
+    })
+        
+@admin_blueprint.route('/reporte')
+def reporte_rango():
+    """Reporte por día, semana o mes entre dos fechas, en JSON o CSV"""
+    redirect_response = check_admin()
+    if redirect_response:
+        return redirect_response
+    
+    hoy = date.today()
+    desde = _parsear_fecha(request.args.get('desde')) or hoy.replace(day=1)
+    hasta = _parsear_fecha(request.args.get('hasta')) or hoy
+    agrupar = request.args.get('agrupar', 'dia')
+    if agrupar not in AGRUPACIONES:
+        return jsonify({'success': False, 'error': f'agrupar debe ser uno de: {", ".join(AGRUPACIONES)}'}), 400
+    # 'resumen' lee resumen_diario (período × cancha); 'reservas' desglosa
+    # además por horario, estado y método de pago
+    fuente = request.args.get('fuente', 'reservas')
+    if fuente not in FUENTES:
+        return jsonify({'success': False, 'error': f'fuente debe ser una de: {", ".join(FUENTES)}'}), 400
+    if hasta < desde:
+        return jsonify({'success': False, 'error': 'La fecha hasta es anterior a desde'}), 400
+    
+    fin = hasta + timedelta(days=1)
+    
+    if request.args.get('formato') == 'csv':
+        filename = f"reporte_{fuente}_{agrupar}_{desde.isoformat()}_{hasta.isoformat()}.csv"
+        return Response(
+            lineas_csv(desde, fin, agrupar, fuente),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+    
+    datos = reporte(obtener_sesion_lectura(), desde, fin, agrupar, fuente)
+    return jsonify({
+        'success': True,
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        **datos
+    })
+
 @admin_blueprint.route('/backup')
 def backup_datos():
     redirect_response = check_admin()
     if redirect_response:
         return redirect_response
     
-    session_db = Session()
+    if request.args.get('modo') == 'stream':
+        return _backup_stream()
+    
+    session_db = obtener_sesion_lectura()
     try:
         from datetime import datetime
         import json
@@ -290,54 +650,139 @@ def backup_datos():
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
-    finally:
-        session_db.close()
+
+def _backup_stream():
+    """Backup por lotes: un archivo NDJSON comprimido con gzip por tabla"""
+    try:
+        fecha_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+        archivos = {}
+        estadisticas = {}
+        for tabla in TABLAS:
+            archivos[tabla] = f"backup_{fecha_str}_{tabla}.ndjson.gz"
+            estadisticas[tabla] = exportar_tabla(tabla, archivos[tabla])
+        
+        return jsonify({
+            'success': True,
+            'message': f'Backup creado: {", ".join(archivos.values())}',
+            'archivos': archivos,
+            'estadisticas': estadisticas
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@admin_blueprint.route('/backup/<tabla>')
+def backup_tabla(tabla):
+    """Descarga una tabla como NDJSON comprimido, generado mientras se envía"""
+    redirect_response = check_admin()
+    if redirect_response:
+        return redirect_response
+    
+    if tabla not in TABLAS:
+        return jsonify({'success': False, 'error': f'Tabla desconocida: {tabla}'}), 404
+    
+    filename = f"{tabla}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson.gz"
+    return Response(
+        comprimir_gzip(lineas_ndjson(tabla)),
+        mimetype='application/gzip',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
 @admin_blueprint.route('/limpiar_reservas_antiguas', methods=['POST'])
 def limpiar_reservas_antiguas():
-    """Elimina reservas de hace más de 30 días (para admin)"""
+    """Archiva y elimina reservas más antiguas que la retención (para admin)"""
     redirect_response = check_admin()
     if redirect_response:
         return jsonify({'success': False, 'error': 'No autorizado'})
     
-    session_db = Session()
+    data = request.get_json(silent=True) or {}
     try:
-        from datetime import timedelta
-        
-        # Reservas de hace más de 30 días
-        fecha_limite = date.today() - timedelta(days=30)
-        
-        reservas_antiguas = session_db.query(Reserva).filter(
-            Reserva.fecha_reserva < fecha_limite
-        ).all()
-        
-        count = len(reservas_antiguas)
-        
-        # Crear backup antes de eliminar
-        backup_data = []
-        for reserva in reservas_antiguas:
-            backup_data.append({
-                'id': reserva.id,
-                'cliente_id': reserva.cliente_id,
-                'cancha_id': reserva.cancha_id,
-                'fecha': reserva.fecha_reserva.isoformat(),
-                'horario': reserva.horario,
-                'estado': reserva.estado
-            })
-        
-        # Eliminar reservas antiguas
-        for reserva in reservas_antiguas:
-            session_db.delete(reserva)
-        
-        session_db.commit()
+        dias = int(data.get('dias', RETENCION_DIAS))
+        tamano_lote = int(data.get('lote', RETENCION_LOTE))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Parámetros inválidos'}), 400
+    if dias < 1 or tamano_lote < 1:
+        return jsonify({'success': False, 'error': 'dias y lote deben ser al menos 1'}), 400
+    
+    try:
+        resultado = purgar_reservas_antiguas(dias, tamano_lote)
+        marcar_escritura()
+        cache_disponibilidad.limpiar()
         
+        fecha_limite = resultado['fecha_limite']
+        count = resultado['archivadas']
         return jsonify({
             'success': True, 
-            'mensaje': f'Se eliminaron {count} reservas antiguas (anteriores a {fecha_limite.strftime("%d/%m/%Y")})',
-            'eliminadas': count
+            'mensaje': f'Se archivaron {count} reservas antiguas (anteriores a {fecha_limite.strftime("%d/%m/%Y")})',
+            'eliminadas': count,
+            'lotes': resultado['lotes'],
+            'segundos': resultado['segundos']
         })
         
     except Exception as e:
-        session_db.rollback()
         return jsonify({'success': False, 'error': str(e)})
-    finally:
-        session_db.close()
\ No newline at end of file
+
+@admin_blueprint.route('/cache')
+def estadisticas_cache():
+    """Aciertos, fallos y desalojos de la caché de disponibilidad"""
+    redirect_response = check_admin()
+    if redirect_response:
+        return jsonify({'success': False, 'error': 'No autorizado'})
+    
+    return jsonify({
+        'success': True,
+        'disponibilidad': cache_disponibilidad.estadisticas(),
+        'dashboard': cache_dashboard.estadisticas(),
+        'catalogo': catalogo_canchas.estadisticas()
+    })
+
+@admin_blueprint.route('/pool')
+def estadisticas_pool():
+    """Uso del pool de conexiones, para dimensionarlo según los workers"""
+    redirect_response = check_admin()
+    if redirect_response:
+        return jsonify({'success': False, 'error': 'No autorizado'})
+    
+    return jsonify({
+        'success': True,
+        'pool': estado_pool(),
+        'replica': {**enrutador.estadisticas(), 'pool': estado_pool(enrutador.replica) if enrutador.replica else None}
+    })
+
+@admin_blueprint.route('/tareas')
+def estadisticas_tareas():
+    """Profundidad de la cola de tareas, resultados y latencias"""
+    redirect_response = check_admin()
+    if redirect_response:
+        return jsonify({'success': False, 'error': 'No autorizado'})
+    
+    return jsonify({'success': True, 'tareas': cola_tareas.estadisticas()})
+
+@admin_blueprint.route('/vencer_pendientes', methods=['POST'])
+def vencer_reservas_pendientes():
+    """Cancela ya las reservas pendientes más antiguas que el TTL"""
+    redirect_response = check_admin()
+    if redirect_response:
+        return jsonify({'success': False, 'error': 'No autorizado'})
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        ttl_minutos = int(data.get('ttl_minutos', PENDIENTE_TTL_MINUTOS))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Parámetros inválidos'}), 400
+    if ttl_minutos < 1:
+        return jsonify({'success': False, 'error': 'ttl_minutos debe ser al menos 1'}), 400
+    
+    try:
+        resultado = vencer_pendientes(ttl_minutos)
+        marcar_escritura()
+        return jsonify({
+            'success': True,
+            'mensaje': f"Se vencieron {resultado['vencidas']} reservas pendientes",
+            'vencidas': resultado['vencidas'],
+            'segundos': resultado['segundos'],
+            'ultimas_pasadas': [
+                {**pasada, 'fecha_limite': pasada['fecha_limite'].isoformat()} for pasada in ultimas_pasadas
+            ]
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
\ No newline at end of file
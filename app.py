@@ -1,140 +1,302 @@
-from flask import Flask, render_template, request, jsonify, session
-from database import Session, Cliente, Cancha, Reserva
+from flask import Flask, render_template, request, jsonify, make_response
+from database import engine, engine_replica, obtener_sesion, cerrar_sesion, Reserva, indice_horario_activo, es_violacion_unica, insert_con_conflicto
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from admin import admin_blueprint
+from cache import cache_disponibilidad
+from catalogo import catalogo_canchas
+from cambios import Cambio, registrar_cambio, registrar_cambios
+from metricas import instalar as instalar_metricas
+from notificaciones import encolar_reservas_creadas
+from tareas import cola_tareas
+from vencimiento import programar as programar_vencimiento
+from versiones import etag, escuchar as escuchar_versiones, versiones
+from disponibilidad import MAX_DIAS, canchas_libres, consulta_horarios_ocupados, consulta_turnos_ocupados, matriz_disponibilidad
+from horarios import CANTIDAD, horarios_de, libres, mascara, normalizar
+from reservas import (CAMPOS_REQUERIDOS_LOTE, validar_reserva, leer_cancha_id, leer_fecha_reserva,
+                      turnos_lote, respuesta_reserva, upsert_cliente)
 from datetime import datetime, date
-import json
+import os
 
 app = Flask(__name__)
 app.secret_key = 'complejo_toledo_secret_key_2024'
 
+# Flujo SSE de disponibilidad, servido por la app ASGI (ver app_async.py);
+# vacío = la página no escucha eventos
+EVENTOS_URL = os.environ.get('EVENTOS_URL', '')
+
+# Cache-Control de las respuestas con ETag: las de disponibilidad se
+# revalidan siempre, la confirmación sólo en el navegador del cliente
+CACHE_INDEX = 'public, max-age=60'
+CACHE_DISPONIBILIDAD = 'public, no-cache'
+CACHE_CONFIRMACION = 'private, no-cache'
+
 app.register_blueprint(admin_blueprint) 
+app.teardown_appcontext(cerrar_sesion)
+instalar_metricas(app, engine, engine_replica)
+escuchar_versiones(engine)
+cola_tareas.iniciar()
+programar_vencimiento()
 
-HORARIOS = [
-    "17:00 - 18:00", 
-    "18:00 - 19:00",
-    "19:00 - 20:00",
-    "20:00 - 21:00", 
-    "21:00 - 22:00",
-    "22:00 - 23:00"
-]
+def _respuesta_condicional(etiqueta, cache_control, generar):
+    """304 si el cliente ya tiene 'etiqueta' (sin llamar a generar(), y por lo
+    tanto sin abrir sesión); si no, la respuesta de generar() con su ETag"""
+    if request.if_none_match.contains_weak(etiqueta):
+        respuesta = app.response_class(status=304)
+    else:
+        respuesta = make_response(generar())
+        if respuesta.status_code != 200:
+            return respuesta
+    respuesta.set_etag(etiqueta, weak=True)
+    respuesta.headers['Cache-Control'] = cache_control
+    return respuesta
 
 @app.route('/')
 def index():
-    session_db = Session()
-    try:
-        canchas = session_db.query(Cancha).filter_by(activa=True).all()
-        return render_template('index.html', canchas=canchas, date_today=date.today().isoformat())
-    finally:
-        session_db.close()
+    canchas = catalogo_canchas.activas()
+    hoy = date.today().isoformat()
+    return _respuesta_condicional(
+        etag('i', catalogo_canchas.version, hoy), CACHE_INDEX,
+        lambda: render_template('index.html', canchas=canchas, date_today=hoy, eventos_url=EVENTOS_URL)
+    )
+
+def _mascara_ocupados(cancha_id, fecha):
+    """Máscara de turnos ocupados de una cancha en un día, servida desde la caché si es posible"""
+    clave = (cancha_id, fecha)
+    ocupados = cache_disponibilidad.obtener(clave)
+    if ocupados is not None:
+        return ocupados
+    
+    generacion = cache_disponibilidad.generacion()
+    session_db = obtener_sesion()
+    ocupados = mascara(session_db.scalars(consulta_horarios_ocupados(cancha_id, fecha)))
+    cache_disponibilidad.guardar(clave, ocupados, generacion)
+    return ocupados
 
 @app.route('/disponibilidad')
 def disponibilidad():
-    session_db = Session()
+    cancha_id = request.args.get('cancha_id')
+    fecha_str = request.args.get('fecha', date.today().isoformat())
+    
     try:
-        cancha_id = request.args.get('cancha_id')
-        fecha_str = request.args.get('fecha', date.today().isoformat())
-        
-        try:
-            fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
-        except:
-            fecha = date.today()
-        
-        reservas = session_db.query(Reserva).filter(
-            Reserva.cancha_id == cancha_id,
-            Reserva.fecha_reserva >= fecha,
-            Reserva.fecha_reserva < fecha.replace(day=fecha.day + 1),
-            Reserva.estado.in_(['pendiente', 'confirmada'])
-        ).all()
-        
-        horarios_ocupados = [r.horario for r in reservas]
-        horarios_disponibles = [h for h in HORARIOS if h not in horarios_ocupados]
-        
+        fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
+    except:
+        fecha = date.today()
+    
+    if not cancha_id or not cancha_id.isdigit():
+        return jsonify({'error': 'cancha_id inválido'}), 400
+    
+    def generar():
+        ocupados = _mascara_ocupados(int(cancha_id), fecha)
         return jsonify({
             'cancha_id': cancha_id,
             'fecha': fecha.isoformat(),
-            'horarios_disponibles': horarios_disponibles,
-            'horarios_ocupados': horarios_ocupados
+            'horarios_disponibles': horarios_de(libres(ocupados)),
+            'horarios_ocupados': horarios_de(ocupados)
         })
-    finally:
-        session_db.close()
+    
+    return _respuesta_condicional(
+        etag('d', cancha_id, fecha.isoformat(), versiones.dia(cancha_id, fecha)), CACHE_DISPONIBILIDAD, generar
+    )
+
+@app.route('/disponibilidad/matriz')
+def disponibilidad_matriz():
+    """Disponibilidad de todas las canchas para un rango de días"""
+    session_db = obtener_sesion()
+    try:
+        desde = datetime.strptime(request.args.get('desde', ''), '%Y-%m-%d').date()
+    except ValueError:
+        desde = date.today()
+    
+    try:
+        dias = int(request.args.get('dias', 14))
+    except ValueError:
+        dias = 14
+    dias = max(1, min(dias, MAX_DIAS))
+    
+    canchas = catalogo_canchas.activas()
+    cancha_ids = request.args.getlist('cancha_id', type=int)
+    if cancha_ids:
+        canchas = [c for c in canchas if c.id in cancha_ids]
+    
+    return jsonify(matriz_disponibilidad(session_db, canchas, desde, dias))
+
+@app.route('/disponibilidad/libres')
+def disponibilidad_libres():
+    """Canchas con 'horas' turnos libres seguidos en una fecha, y en qué
+    turnos pueden empezar; con 'horario', sólo las libres desde ese turno"""
+    try:
+        fecha = datetime.strptime(request.args.get('fecha', ''), '%Y-%m-%d').date()
+    except ValueError:
+        fecha = date.today()
+    
+    horas = request.args.get('horas', 1, type=int) or 1
+    if not 1 <= horas <= CANTIDAD:
+        return jsonify({'error': f'horas debe estar entre 1 y {CANTIDAD}'}), 400
+    horario = request.args.get('horario')
+    
+    resultado = canchas_libres(obtener_sesion(), catalogo_canchas.activas(), fecha, horas, horario)
+    return jsonify({
+        'fecha': fecha.isoformat(),
+        'horas': horas,
+        'canchas': resultado
+    })
 
 @app.route('/reservar', methods=['POST'])
 def reservar():
-    session_db = Session()
+    session_db = obtener_sesion()
     try:
         datos = request.json
         
-        required_fields = ['nombre', 'apellido', 'cedula', 'telefono', 'cancha_id', 'horario', 'metodo_pago']
-        for field in required_fields:
-            if field not in datos or not str(datos[field]).strip():
-                return jsonify({'error': f'Campo requerido: {field}'}), 400
-        
-        cliente = session_db.query(Cliente).filter_by(cedula=datos['cedula']).first()
-        if not cliente:
-            cliente = Cliente(
-                cedula=datos['cedula'],
-                nombre=datos['nombre'],
-                apellido=datos['apellido'],
-                telefono=datos['telefono'],
-                email=datos.get('email', '')
-            )
-            session_db.add(cliente)
-            session_db.flush()
+        error = validar_reserva(datos)
+        if error:
+            return jsonify({'error': error}), 400
         
-        cancha = session_db.query(Cancha).get(datos['cancha_id'])
+        cancha_id = leer_cancha_id(datos)
+        cancha = catalogo_canchas.obtener(cancha_id) if cancha_id is not None else None
         if not cancha:
             return jsonify({'error': 'Cancha no encontrada'}), 400
         
+        cliente_id = session_db.execute(upsert_cliente(session_db, datos)).scalar_one()
+        
         horas = 1
         monto_total = cancha.precio_hora * horas
         
-        fecha_reserva = datetime.strptime(datos.get('fecha', date.today().isoformat()), '%Y-%m-%d').date()
-        reserva_existente = session_db.query(Reserva).filter(
-            Reserva.cancha_id == datos['cancha_id'],
-            Reserva.fecha_reserva >= fecha_reserva,
-            Reserva.fecha_reserva < fecha_reserva.replace(day=fecha_reserva.day + 1),
-            Reserva.horario == datos['horario'],
-            Reserva.estado.in_(['pendiente', 'confirmada'])
-        ).first()
-        
-        if reserva_existente:
-            return jsonify({'error': 'Este horario ya está reservado'}), 400
-        
+        fecha_reserva = leer_fecha_reserva(datos)
         reserva = Reserva(
-            cliente_id=cliente.id,
-            cancha_id=datos['cancha_id'],
+            cliente_id=cliente_id,
+            cancha_id=cancha.id,
             fecha_reserva=fecha_reserva,
-            horario=datos['horario'],
+            horario=normalizar(datos['horario']),
             horas=horas,
             metodo_pago=datos['metodo_pago'],
             monto_total=monto_total,
             estado='pendiente'
         )
         
+        # El índice único parcial sobre reservas activas rechaza el doble
+        # registro del mismo horario, sin consulta previa y sin carreras
         session_db.add(reserva)
+        try:
+            session_db.flush()
+        except IntegrityError as e:
+            session_db.rollback()
+            if es_violacion_unica(e, indice_horario_activo):
+                return jsonify({'error': 'Este horario ya está reservado'}), 400
+            raise
+        reserva_id = reserva.id
+        registrar_cambio(session_db, cancha.id, fecha_reserva, None, 'pendiente', monto_total,
+                         reserva.horario, reserva_id)
+        # Los mensajes salen después del commit, fuera de esta petición
+        encolar_reservas_creadas(session_db, [reserva_id])
         session_db.commit()
         
-        return jsonify({
-            'success': True,
-            'reserva_id': reserva.id,
-            'mensaje': f'✅ Reserva confirmada. ID: {reserva.id}',
-            'detalles': {
-                'cliente': f"{datos['nombre']} {datos['apellido']}",
-                'cancha': cancha.nombre,
-                'tipo': cancha.tipo,
-                'horario': datos['horario'],
-                'fecha': fecha_reserva.strftime('%d/%m/%Y'),
+        return jsonify(respuesta_reserva(reserva_id, datos, cancha, fecha_reserva, monto_total))
+        
+    except Exception as e:
+        session_db.rollback()
+        return jsonify({'error': f'Error al procesar reserva: {str(e)}'}), 500
+@app.route('/reservar/lote', methods=['POST'])
+def reservar_lote():
+    """Varios turnos de una cancha en una transacción: horas seguidas y/o
+    fechas recurrentes (ver reservas.turnos_lote).
+
+    Con 'atomico' (por defecto) se reservan todos o ninguno; si no, se
+    reservan los libres y el resultado indica cuáles estaban ocupados.
+    """
+    session_db = obtener_sesion()
+    try:
+        datos = request.json
+        
+        error = validar_reserva(datos, CAMPOS_REQUERIDOS_LOTE)
+        if error:
+            return jsonify({'error': error}), 400
+        try:
+            turnos = turnos_lote(datos)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        atomico = bool(datos.get('atomico', True))
+        
+        cancha_id = leer_cancha_id(datos)
+        cancha = catalogo_canchas.obtener(cancha_id) if cancha_id is not None else None
+        if not cancha:
+            return jsonify({'error': 'Cancha no encontrada'}), 400
+        
+        # Una sola consulta de conflictos para todos los turnos
+        ocupados = {
+            (fecha, normalizar(horario))
+            for fecha, horario in session_db.execute(consulta_turnos_ocupados(cancha.id, turnos))
+        } & set(turnos)
+        if ocupados and atomico:
+            return jsonify({
+                'error': 'Hay horarios ya reservados; no se reservó ninguno',
+                'resultados': _resultados_lote(turnos, {}, ocupados)
+            }), 400
+        
+        por_reservar = [turno for turno in turnos if turno not in ocupados]
+        reservados = {}
+        if por_reservar:
+            cliente_id = session_db.execute(upsert_cliente(session_db, datos)).scalar_one()
+            monto = cancha.precio_hora
+            insercion = insert_con_conflicto(session_db, Reserva).values([{
+                'cliente_id': cliente_id,
+                'cancha_id': cancha.id,
+                'fecha_reserva': fecha,
+                'horario': horario,
+                'horas': 1,
                 'metodo_pago': datos['metodo_pago'],
-                'monto': f'Gs{monto_total:,}',
-                'duracion':'una hora'
-            }
+                'monto_total': monto,
+                'estado': 'pendiente'
+            } for fecha, horario in por_reservar])
+            if not atomico:
+                # Un turno tomado entre la consulta y el INSERT se omite sin abortar el resto
+                insercion = insercion.on_conflict_do_nothing(
+                    index_elements=list(indice_horario_activo.expressions),
+                    index_where=indice_horario_activo.dialect_options[session_db.get_bind().dialect.name]['where']
+                )
+            insercion = insercion.returning(Reserva.id, Reserva.fecha_reserva, Reserva.horario)
+            try:
+                filas = session_db.execute(insercion).all()
+            except IntegrityError as e:
+                session_db.rollback()
+                if es_violacion_unica(e, indice_horario_activo):
+                    return jsonify({'error': 'Este horario ya está reservado'}), 400
+                raise
+            
+            for reserva_id, fecha_reserva, horario in filas:
+                fecha = fecha_reserva.date() if isinstance(fecha_reserva, datetime) else fecha_reserva
+                reservados[(fecha, horario)] = reserva_id
+            registrar_cambios(session_db, [
+                Cambio(cancha.id, fecha, None, 'pendiente', monto, horario, reserva_id)
+                for (fecha, horario), reserva_id in reservados.items()
+            ])
+            ocupados.update(turno for turno in por_reservar if turno not in reservados)
+            encolar_reservas_creadas(session_db, list(reservados.values()))
+        session_db.commit()
+        
+        return jsonify({
+            'success': bool(reservados),
+            'atomico': atomico,
+            'cancha': cancha.nombre,
+            'reservados': len(reservados),
+            'ocupados': len(ocupados),
+            'monto_total': f'Gs{cancha.precio_hora * len(reservados):,}',
+            'resultados': _resultados_lote(turnos, reservados, ocupados)
         })
         
     except Exception as e:
         session_db.rollback()
         return jsonify({'error': f'Error al procesar reserva: {str(e)}'}), 500
-    finally:
-        session_db.close()
+
+def _resultados_lote(turnos, reservados, ocupados):
+    return [{
+        'fecha': fecha.isoformat(),
+        'horario': horario,
+        'reservado': (fecha, horario) in reservados,
+        'reserva_id': reservados.get((fecha, horario)),
+        'error': 'Este horario ya está reservado' if (fecha, horario) in ocupados else None
+    } for fecha, horario in turnos]
+
 @app.route('/reservar')
 def landing_reservas():
     """Página de landing para compartir en WhatsApp"""
@@ -142,21 +304,23 @@ def landing_reservas():
 
 @app.route('/confirmacion/<int:reserva_id>')
 def confirmacion(reserva_id):
-    session_db = Session()
-    try:
-        reserva = session_db.query(Reserva).get(reserva_id)
+    def generar():
+        session_db = obtener_sesion()
+        reserva = session_db.query(Reserva).options(
+            joinedload(Reserva.cliente)
+        ).filter(Reserva.id == reserva_id).first()
         if not reserva:
             return "Reserva no encontrada", 404
         
-        cliente = session_db.query(Cliente).get(reserva.cliente_id)
-        cancha = session_db.query(Cancha).get(reserva.cancha_id)
+        cancha = catalogo_canchas.obtener(reserva.cancha_id, session_db)
         
         return render_template('confirmacion.html', 
                              reserva=reserva, 
-                             cliente=cliente, 
+                             cliente=reserva.cliente, 
                              cancha=cancha)
-    finally:
-        session_db.close()
+    
+    etiqueta = etag('r', reserva_id, versiones.reserva(reserva_id), catalogo_canchas.version)
+    return _respuesta_condicional(etiqueta, CACHE_CONFIRMACION, generar)
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,289 @@
+"""Modo ASGI de la API pública de reservas.
+
+Sirve /, /disponibilidad, /disponibilidad/matriz, /disponibilidad/libres,
+/reservar y /confirmacion/<id> con los mismos contratos que app.py, pero con
+acceso asíncrono a la base: una petición esperando a PostgreSQL no ocupa un
+hilo. /reservar/lote y el panel de administración siguen sólo en la app
+síncrona, que es la de siempre.
+
+    uvicorn app_async:app --host 0.0.0.0 --port 5001
+    hypercorn app_async:app --bind 0.0.0.0:5001
+"""
+from quart import Quart, Response, render_template, request, jsonify, make_response
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from database import engine, Reserva, indice_horario_activo, es_violacion_unica
+from database_async import SesionAsync, engine_async
+from eventos import DifusorEventos
+from cache import cache_disponibilidad
+from catalogo import catalogo_canchas
+from cambios import registrar_cambio
+from notificaciones import encolar_reservas_creadas
+from tareas import cola_tareas
+from vencimiento import programar as programar_vencimiento
+from disponibilidad import MAX_DIAS, canchas_libres, consulta_horarios_ocupados, matriz_disponibilidad
+from horarios import CANTIDAD, horarios_de, libres, mascara, normalizar
+from versiones import etag, escuchar as escuchar_versiones, versiones
+from reservas import validar_reserva, leer_cancha_id, leer_fecha_reserva, respuesta_reserva, upsert_cliente
+from datetime import datetime, date
+import asyncio
+import json
+
+app = Quart(__name__)
+app.secret_key = 'complejo_toledo_secret_key_2024'
+
+# Segundos entre comentarios de keep-alive en los flujos SSE
+SSE_KEEPALIVE = 15
+
+# Cache-Control de las respuestas con ETag, como en app.py
+CACHE_INDEX = 'public, max-age=60'
+CACHE_DISPONIBILIDAD = 'public, no-cache'
+CACHE_CONFIRMACION = 'private, no-cache'
+
+difusor = DifusorEventos()
+escuchar_versiones(engine)
+programar_vencimiento()
+
+async def _respuesta_condicional(etiqueta, cache_control, generar):
+    """304 si el cliente ya tiene 'etiqueta', sin esperar a generar(); si no,
+    la respuesta de la corrutina generar() con su ETag"""
+    if request.if_none_match.contains_weak(etiqueta):
+        respuesta = Response('', status=304)
+    else:
+        respuesta = await make_response(await generar())
+        if respuesta.status_code != 200:
+            return respuesta
+    respuesta.set_etag(etiqueta, weak=True)
+    respuesta.headers['Cache-Control'] = cache_control
+    return respuesta
+
+@app.before_serving
+async def iniciar_eventos():
+    await difusor.iniciar(engine_async.url)
+    cola_tareas.iniciar()
+
+@app.after_serving
+async def detener_eventos():
+    await difusor.detener()
+    await asyncio.to_thread(cola_tareas.detener)
+
+async def _canchas_activas(sesion):
+    # El catálogo sólo consulta la base al vencer su TTL
+    return await catalogo_canchas.activas_async(sesion)
+
+@app.route('/')
+async def index():
+    async with SesionAsync() as sesion:
+        canchas = await _canchas_activas(sesion)
+    hoy = date.today().isoformat()
+    
+    async def generar():
+        return await render_template('index.html', canchas=canchas, date_today=hoy,
+                                     eventos_url='/disponibilidad/eventos')
+    
+    return await _respuesta_condicional(etag('i', catalogo_canchas.version, hoy), CACHE_INDEX, generar)
+
+async def _mascara_ocupados(cancha_id, fecha):
+    """Máscara de turnos ocupados de una cancha en un día, servida desde la caché si es posible"""
+    clave = (cancha_id, fecha)
+    ocupados = cache_disponibilidad.obtener(clave)
+    if ocupados is not None:
+        return ocupados
+    
+    generacion = cache_disponibilidad.generacion()
+    async with SesionAsync() as sesion:
+        ocupados = mascara(await sesion.scalars(consulta_horarios_ocupados(cancha_id, fecha)))
+    cache_disponibilidad.guardar(clave, ocupados, generacion)
+    return ocupados
+
+@app.route('/disponibilidad')
+async def disponibilidad():
+    cancha_id = request.args.get('cancha_id')
+    fecha_str = request.args.get('fecha', date.today().isoformat())
+    
+    try:
+        fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
+    except ValueError:
+        fecha = date.today()
+    
+    if not cancha_id or not cancha_id.isdigit():
+        return jsonify({'error': 'cancha_id inválido'}), 400
+    
+    async def generar():
+        ocupados = await _mascara_ocupados(int(cancha_id), fecha)
+        return jsonify({
+            'cancha_id': cancha_id,
+            'fecha': fecha.isoformat(),
+            'horarios_disponibles': horarios_de(libres(ocupados)),
+            'horarios_ocupados': horarios_de(ocupados)
+        })
+    
+    return await _respuesta_condicional(
+        etag('d', cancha_id, fecha.isoformat(), versiones.dia(cancha_id, fecha)), CACHE_DISPONIBILIDAD, generar
+    )
+
+@app.route('/disponibilidad/matriz')
+async def disponibilidad_matriz():
+    """Disponibilidad de todas las canchas para un rango de días"""
+    try:
+        desde = datetime.strptime(request.args.get('desde', ''), '%Y-%m-%d').date()
+    except ValueError:
+        desde = date.today()
+    
+    try:
+        dias = int(request.args.get('dias', 14))
+    except ValueError:
+        dias = 14
+    dias = max(1, min(dias, MAX_DIAS))
+    
+    cancha_ids = request.args.getlist('cancha_id', type=int)
+    async with SesionAsync() as sesion:
+        canchas = await _canchas_activas(sesion)
+        if cancha_ids:
+            canchas = [c for c in canchas if c.id in cancha_ids]
+        matriz = await sesion.run_sync(matriz_disponibilidad, canchas, desde, dias)
+    
+    return jsonify(matriz)
+
+@app.route('/disponibilidad/eventos')
+async def disponibilidad_eventos():
+    """Server-Sent Events con los turnos que se ocupan o liberan en una fecha.
+
+    Eventos 'ocupado' y 'liberado' con {tipo, cancha_id, fecha, horario};
+    'recargar' si el cliente se atrasó y debe volver a consultar /disponibilidad.
+    """
+    try:
+        fecha = datetime.strptime(request.args.get('fecha', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'fecha inválida'}), 400
+    
+    async def flujo():
+        cola = difusor.suscribir(fecha)
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    evento = await asyncio.wait_for(cola.get(), timeout=SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield f"event: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n".encode()
+        finally:
+            difusor.desuscribir(fecha, cola)
+    
+    respuesta = await make_response(flujo(), 200, {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+        # La página puede venir de la app WSGI en otro puerto
+        'Access-Control-Allow-Origin': '*'
+    })
+    respuesta.timeout = None
+    return respuesta
+
+@app.route('/disponibilidad/libres')
+async def disponibilidad_libres():
+    """Canchas con 'horas' turnos libres seguidos en una fecha, y en qué
+    turnos pueden empezar; con 'horario', sólo las libres desde ese turno"""
+    try:
+        fecha = datetime.strptime(request.args.get('fecha', ''), '%Y-%m-%d').date()
+    except ValueError:
+        fecha = date.today()
+    
+    horas = request.args.get('horas', 1, type=int) or 1
+    if not 1 <= horas <= CANTIDAD:
+        return jsonify({'error': f'horas debe estar entre 1 y {CANTIDAD}'}), 400
+    horario = request.args.get('horario')
+    
+    async with SesionAsync() as sesion:
+        canchas = await _canchas_activas(sesion)
+        resultado = await sesion.run_sync(canchas_libres, canchas, fecha, horas, horario)
+    return jsonify({
+        'fecha': fecha.isoformat(),
+        'horas': horas,
+        'canchas': resultado
+    })
+
+@app.route('/reservar', methods=['POST'])
+async def reservar():
+    async with SesionAsync() as sesion:
+        try:
+            datos = await request.get_json()
+            
+            error = validar_reserva(datos)
+            if error:
+                return jsonify({'error': error}), 400
+            
+            cancha_id = leer_cancha_id(datos)
+            cancha = None
+            if cancha_id is not None:
+                cancha = await catalogo_canchas.obtener_async(cancha_id, sesion)
+            if not cancha:
+                return jsonify({'error': 'Cancha no encontrada'}), 400
+            
+            cliente_id = (await sesion.execute(upsert_cliente(sesion, datos))).scalar_one()
+            
+            horas = 1
+            monto_total = cancha.precio_hora * horas
+            
+            fecha_reserva = leer_fecha_reserva(datos)
+            reserva = Reserva(
+                cliente_id=cliente_id,
+                cancha_id=cancha.id,
+                fecha_reserva=fecha_reserva,
+                horario=normalizar(datos['horario']),
+                horas=horas,
+                metodo_pago=datos['metodo_pago'],
+                monto_total=monto_total,
+                estado='pendiente'
+            )
+            
+            # Igual que en app.py: el índice único parcial rechaza el doble registro
+            sesion.add(reserva)
+            try:
+                await sesion.flush()
+            except IntegrityError as e:
+                await sesion.rollback()
+                if es_violacion_unica(e, indice_horario_activo):
+                    return jsonify({'error': 'Este horario ya está reservado'}), 400
+                raise
+            reserva_id = reserva.id
+            await sesion.run_sync(registrar_cambio, cancha.id, fecha_reserva, None, 'pendiente', monto_total,
+                                 reserva.horario, reserva_id)
+            await sesion.run_sync(encolar_reservas_creadas, [reserva_id])
+            await sesion.commit()
+            
+            return jsonify(respuesta_reserva(reserva_id, datos, cancha, fecha_reserva, monto_total))
+            
+        except Exception as e:
+            await sesion.rollback()
+            return jsonify({'error': f'Error al procesar reserva: {str(e)}'}), 500
+
+@app.route('/reservar')
+async def reservas():
+    """Página de landing para compartir en WhatsApp"""
+    return await render_template('landing.html')
+
+@app.route('/confirmacion/<int:reserva_id>')
+async def confirmacion(reserva_id):
+    async def generar():
+        async with SesionAsync() as sesion:
+            reserva = (await sesion.scalars(
+                select(Reserva).options(joinedload(Reserva.cliente)).where(Reserva.id == reserva_id)
+            )).first()
+            if not reserva:
+                return "Reserva no encontrada", 404
+            
+            cancha = await catalogo_canchas.obtener_async(reserva.cancha_id, sesion)
+        
+        return await render_template('confirmacion.html', 
+                                     reserva=reserva, 
+                                     cliente=reserva.cliente, 
+                                     cancha=cancha)
+    
+    etiqueta = etag('r', reserva_id, versiones.reserva(reserva_id), catalogo_canchas.version)
+    return await _respuesta_condicional(etiqueta, CACHE_CONFIRMACION, generar)
+
+if __name__ == '__main__':
+    app.run(debug=True, host='0.0.0.0', port=5001)
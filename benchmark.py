@@ -0,0 +1,333 @@
+"""Benchmark de los endpoints de reservas con clientes concurrentes.
+
+Crea una base local con un volumen configurable de clientes y reservas,
+levanta la app Flask en un hilo y mide cada escenario: latencia p50/p95/p99,
+peticiones por segundo y consultas SQL por petición (en la primaria y en la
+réplica, si hay REPLICA_URL). Los trabajos de fondo de la app (cola de
+tareas, vencimiento y escucha de versiones) no corren durante la medición,
+así sus consultas no se atribuyen a las peticiones.
+
+    python benchmark.py                                   # SQLite en benchmark.db
+    python benchmark.py --url postgresql+psycopg2://.../bench --reservas 200000
+    python benchmark.py --escenarios disponibilidad reservar_contendido --json resultado.json
+
+La base indicada en --url se borra y se vuelve a crear: no usar la de producción.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+ESCENARIOS = ['disponibilidad', 'reservar', 'reservar_contendido', 'admin_reservas', 'admin_backup']
+
+# Pedidos simultáneos por el mismo turno en reservar_contendido: sólo uno debe ganar
+RAFAGA = 8
+
+def _ms(segundos):
+    return round(segundos * 1000, 2) if segundos is not None else None
+
+def _percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))]
+
+class ContadorConsultas:
+    """Cuenta las sentencias que los engines envían a la base"""
+
+    def __init__(self, *engines):
+        from sqlalchemy import event
+        self._lock = threading.Lock()
+        self.total = 0
+        for engine in engines:
+            if engine is not None:
+                event.listen(engine, 'before_cursor_execute', self._contar)
+
+    def _contar(self, *args):
+        with self._lock:
+            self.total += 1
+
+class ClienteHttp:
+    """Cliente HTTP mínimo; una conexión por petición, como un navegador sin keep-alive"""
+
+    def __init__(self, puerto):
+        self.puerto = puerto
+        self.cookie = None
+
+    def pedir(self, metodo, ruta, cuerpo=None):
+        conexion = http.client.HTTPConnection('127.0.0.1', self.puerto, timeout=60)
+        cabeceras = {}
+        if cuerpo is not None:
+            cuerpo = json.dumps(cuerpo)
+            cabeceras['Content-Type'] = 'application/json'
+        if self.cookie:
+            cabeceras['Cookie'] = self.cookie
+        try:
+            conexion.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+            respuesta = conexion.getresponse()
+            datos = respuesta.read()
+            cookie = respuesta.getheader('Set-Cookie')
+            if cookie:
+                self.cookie = cookie.split(';', 1)[0]
+            return respuesta.status, datos
+        finally:
+            conexion.close()
+
+    def iniciar_sesion_admin(self, password):
+        self.pedir('POST', '/admin/login', {'password': password})
+
+def sembrar(clientes, reservas, dias, semilla):
+    """Base desde cero con 'clientes' y 'reservas' repartidas en +-'dias'/2 de hoy"""
+    from database import Base, Cliente, Reserva, engine, init_db, insertar_datos_ejemplo
+    from catalogo import catalogo_canchas
+    from horarios import HORARIOS
+    from resumen import reconstruir_resumen
+
+    aleatorio = random.Random(semilla)
+    Base.metadata.drop_all(engine)
+    init_db()
+    insertar_datos_ejemplo()
+    canchas = catalogo_canchas.todas()
+
+    hoy = date.today()
+    inicio = hoy - timedelta(days=dias // 2)
+    tomados = set()
+    filas = []
+    for _ in range(reservas):
+        cancha = aleatorio.choice(canchas)
+        fecha = inicio + timedelta(days=aleatorio.randrange(dias))
+        horario = aleatorio.choice(HORARIOS)
+        estado = aleatorio.choice(['pendiente', 'confirmada', 'completada', 'cancelada'])
+        if estado in ('pendiente', 'confirmada'):
+            # Como mucho una reserva activa por turno, igual que en producción
+            if (cancha.id, fecha, horario) in tomados:
+                estado = 'cancelada'
+            else:
+                tomados.add((cancha.id, fecha, horario))
+        filas.append({
+            'cliente_id': aleatorio.randrange(clientes) + 1,
+            'cancha_id': cancha.id,
+            'fecha_reserva': fecha,
+            'horario': horario,
+            'horas': 1,
+            'estado': estado,
+            'metodo_pago': aleatorio.choice(['efectivo', 'tarjeta', 'transferencia']),
+            'monto_total': cancha.precio_hora
+        })
+
+    lote = 5000
+    with engine.begin() as conexion:
+        for i in range(0, clientes, lote):
+            # Tabla recién creada: los ids van de 1 a 'clientes'
+            conexion.execute(Cliente.__table__.insert(), [{
+                'cedula': f"B{n + 1:08d}",
+                'nombre': f"Cliente{n + 1}",
+                'apellido': "Benchmark",
+                'telefono': f"09{n + 1:08d}",
+                'email': ''
+            } for n in range(i, min(i + lote, clientes))])
+        for i in range(0, len(filas), lote):
+            conexion.execute(Reserva.__table__.insert(), filas[i:i + lote])
+        reconstruir_resumen(conexion)
+    return canchas, inicio
+
+def _medir(nombre, peticiones, concurrencia, tarea, contador):
+    """Ejecuta 'tarea(i)' -> status 'peticiones' veces con 'concurrencia' hilos"""
+    latencias = []
+    estados = {}
+    errores = 0
+    lock = threading.Lock()
+
+    def una(i):
+        nonlocal errores
+        inicio = time.perf_counter()
+        try:
+            status = tarea(i)
+        except Exception:
+            status = 'excepción'
+        duracion = time.perf_counter() - inicio
+        with lock:
+            latencias.append(duracion)
+            estados[status] = estados.get(status, 0) + 1
+            if status == 'excepción' or (isinstance(status, int) and status >= 500):
+                errores += 1
+
+    consultas_inicio = contador.total
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+        list(ejecutor.map(una, range(peticiones)))
+    total = time.perf_counter() - inicio
+
+    return {
+        'escenario': nombre,
+        'peticiones': peticiones,
+        'concurrencia': concurrencia,
+        'errores': errores,
+        'estados': {str(k): v for k, v in sorted(estados.items(), key=str)},
+        'rps': round(peticiones / total, 1) if total else None,
+        'p50_ms': _ms(_percentil(latencias, 50)),
+        'p95_ms': _ms(_percentil(latencias, 95)),
+        'p99_ms': _ms(_percentil(latencias, 99)),
+        'consultas_por_peticion': round((contador.total - consultas_inicio) / peticiones, 2) if peticiones else None
+    }
+
+def escenarios(puerto, canchas, inicio, dias, semilla, password):
+    """Tarea de cada escenario, tarea(i) -> status HTTP, y el conteo de
+    reservas ganadas por turno disputado en reservar_contendido"""
+    from horarios import HORARIOS
+    aleatorio = random.Random(semilla + 1)
+    publico = ClienteHttp(puerto)
+    admin = ClienteHttp(puerto)
+    admin.iniciar_sesion_admin(password)
+    hoy = date.today()
+    futuro = hoy + timedelta(days=dias)
+
+    def fecha_aleatoria():
+        return (inicio + timedelta(days=aleatorio.randrange(dias))).isoformat()
+
+    def disponibilidad(i):
+        cancha = aleatorio.choice(canchas)
+        return publico.pedir('GET', f"/disponibilidad?cancha_id={cancha.id}&fecha={fecha_aleatoria()}")[0]
+
+    def _pedido_reserva(cedula, cancha_id, fecha, horario):
+        return {
+            'nombre': 'Bench', 'apellido': 'Mark', 'cedula': cedula, 'telefono': '0981000000',
+            'cancha_id': cancha_id, 'fecha': fecha, 'horario': horario, 'metodo_pago': 'efectivo'
+        }
+
+    def reservar(i):
+        # Fechas posteriores al rango sembrado: la mayoría de los turnos están libres
+        fecha = (futuro + timedelta(days=aleatorio.randrange(365))).isoformat()
+        pedido = _pedido_reserva(f"R{i:08d}", aleatorio.choice(canchas).id, fecha, aleatorio.choice(HORARIOS))
+        return publico.pedir('POST', '/reservar', pedido)[0]
+
+    ganadores = {}
+    lock = threading.Lock()
+
+    def reservar_contendido(i):
+        turno = i // RAFAGA
+        fecha = (futuro + timedelta(days=400 + turno // len(HORARIOS))).isoformat()
+        horario = HORARIOS[turno % len(HORARIOS)]
+        pedido = _pedido_reserva(f"C{i:08d}", canchas[0].id, fecha, horario)
+        status = publico.pedir('POST', '/reservar', pedido)[0]
+        if status == 200:
+            with lock:
+                ganadores[turno] = ganadores.get(turno, 0) + 1
+        return status
+
+    cursores = [None]
+
+    def admin_reservas(i):
+        # Recorre páginas sucesivas con el cursor, volviendo a la primera al terminar
+        cursor = cursores[-1]
+        ruta = '/admin/reservas/datos?limite=50' + (f"&cursor={cursor}" if cursor else '')
+        status, datos = admin.pedir('GET', ruta)
+        if status == 200:
+            siguiente = json.loads(datos).get('siguiente_cursor')
+            cursores.append(siguiente)
+        return status
+
+    def admin_backup(i):
+        return admin.pedir('GET', '/admin/backup/reservas')[0]
+
+    return {
+        'disponibilidad': disponibilidad,
+        'reservar': reservar,
+        'reservar_contendido': reservar_contendido,
+        'admin_reservas': admin_reservas,
+        'admin_backup': admin_backup
+    }, ganadores
+
+def _imprimir(resultados):
+    columnas = ['escenario', 'peticiones', 'errores', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'consultas_por_peticion']
+    titulos = ['escenario', 'pet.', 'err.', 'rps', 'p50 ms', 'p95 ms', 'p99 ms', 'sql/pet.']
+    anchos = [22, 7, 6, 9, 9, 9, 9, 9]
+    print(''.join(t.ljust(a) for t, a in zip(titulos, anchos)))
+    print('-' * sum(anchos))
+    for r in resultados:
+        print(''.join(str(r[c]).ljust(a) for c, a in zip(columnas, anchos)))
+    for r in resultados:
+        print(f"  {r['escenario']}: estados {r['estados']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de los endpoints de reservas")
+    parser.add_argument('--url', default='sqlite:///benchmark.db', help="base a crear (se borra)")
+    parser.add_argument('--clientes', type=int, default=2000)
+    parser.add_argument('--reservas', type=int, default=20000)
+    parser.add_argument('--dias', type=int, default=120, help="días que abarcan las reservas sembradas")
+    parser.add_argument('--peticiones', type=int, default=500, help="peticiones por escenario")
+    parser.add_argument('--concurrencia', type=int, default=8)
+    parser.add_argument('--escenarios', nargs='+', choices=ESCENARIOS, default=ESCENARIOS)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--json', help="guardar los resultados en este archivo")
+    parser.add_argument('--sin-sembrar', action='store_true', help="usar la base tal como está")
+    args = parser.parse_args()
+
+    # database.py crea el engine y app.py arranca los hilos de fondo al importarse
+    os.environ['DATABASE_URL'] = args.url
+    os.environ['TAREAS_HILOS'] = '0'
+    os.environ['VENCIMIENTO_INTERVALO'] = '0'
+    os.environ['VERSIONES_ESCUCHA'] = '0'
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from app import app
+    from admin import ADMIN_PASSWORD
+    from catalogo import catalogo_canchas
+    from database import engine, engine_replica
+
+    if args.sin_sembrar:
+        canchas, inicio = catalogo_canchas.todas(), date.today() - timedelta(days=args.dias // 2)
+    else:
+        t0 = time.perf_counter()
+        canchas, inicio = sembrar(args.clientes, args.reservas, args.dias, args.semilla)
+        print(f"🌱 Base sembrada: {args.clientes} clientes, {args.reservas} reservas "
+              f"({time.perf_counter() - t0:.1f} s)")
+    canchas = [c for c in canchas if c.activa]
+
+    class _ManejadorSilencioso(WSGIRequestHandler):
+        # Sin una línea de log por petición
+        def log_request(self, *args, **kwargs):
+            pass
+
+    servidor = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_ManejadorSilencioso)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    contador = ContadorConsultas(engine, engine_replica)
+
+    try:
+        tareas, ganadores = escenarios(
+            servidor.server_port, canchas, inicio, args.dias, args.semilla, ADMIN_PASSWORD
+        )
+        resultados = []
+        for nombre in args.escenarios:
+            peticiones = args.peticiones
+            concurrencia = args.concurrencia
+            if nombre == 'admin_backup':
+                # Cada petición exporta la tabla completa
+                peticiones = max(args.concurrencia, args.peticiones // 50)
+            if nombre == 'reservar_contendido':
+                peticiones -= peticiones % RAFAGA
+                concurrencia = max(concurrencia, RAFAGA)
+            resultado = _medir(nombre, peticiones, concurrencia, tareas[nombre], contador)
+            if nombre == 'reservar_contendido':
+                resultado['turnos_disputados'] = peticiones // RAFAGA
+                resultado['turnos_con_doble_reserva'] = sum(1 for n in ganadores.values() if n > 1)
+            resultados.append(resultado)
+    finally:
+        servidor.shutdown()
+
+    _imprimir(resultados)
+    contendido = next((r for r in resultados if r['escenario'] == 'reservar_contendido'), None)
+    if contendido:
+        marca = "✅" if contendido['turnos_con_doble_reserva'] == 0 else "❌"
+        print(f"{marca} Turnos con doble reserva: {contendido['turnos_con_doble_reserva']} "
+              f"de {contendido['turnos_disputados']}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'parametros': vars(args), 'resultados': resultados}, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+class CacheLRU:
+    """Caché en memoria acotada, con desalojo LRU y contadores de uso.
+
+    Cada invalidación incrementa una generación; un valor calculado antes
+    de una invalidación no se guarda, así una lectura lenta no puede dejar
+    en caché datos anteriores a una escritura. Con 'ttl' (segundos) las
+    entradas además vencen solas.
+    """
+
+    def __init__(self, capacidad=1024, ttl=None):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self._lock_calculo = threading.Lock()
+        self._generacion = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.invalidaciones = 0
+
+    def generacion(self):
+        return self._generacion
+
+    def _buscar(self, clave):
+        entrada = self._datos.get(clave)
+        if entrada is None:
+            return None
+        valor, vence = entrada
+        if vence is not None and vence <= time.monotonic():
+            del self._datos[clave]
+            return None
+        self._datos.move_to_end(clave)
+        return valor
+
+    def obtener(self, clave):
+        with self._lock:
+            valor = self._buscar(clave)
+            if valor is not None:
+                self.aciertos += 1
+            else:
+                self.fallos += 1
+            return valor
+
+    def obtener_o_calcular(self, clave, calcular):
+        """Como obtener(), pero ante un fallo calcula el valor una sola vez
+        aunque lleguen varias peticiones a la vez"""
+        valor = self.obtener(clave)
+        if valor is not None:
+            return valor
+        with self._lock_calculo:
+            with self._lock:
+                valor = self._buscar(clave)
+            if valor is None:
+                generacion = self._generacion
+                valor = calcular()
+                self.guardar(clave, valor, generacion)
+            return valor
+
+    def guardar(self, clave, valor, generacion=None):
+        with self._lock:
+            if generacion is not None and generacion != self._generacion:
+                return
+            vence = time.monotonic() + self.ttl if self.ttl else None
+            self._datos[clave] = (valor, vence)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.capacidad:
+                self._datos.popitem(last=False)
+                self.desalojos += 1
+
+    def invalidar(self, clave):
+        with self._lock:
+            self._generacion += 1
+            self.invalidaciones += 1
+            self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._generacion += 1
+            self.invalidaciones += 1
+            self._datos.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._datos),
+                'capacidad': self.capacidad,
+                'ttl': self.ttl,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else 0,
+                'desalojos': self.desalojos,
+                'invalidaciones': self.invalidaciones
+            }
+
+# Horarios ocupados por (cancha_id, fecha). Las escrituras la invalidan al
+# confirmar, en este proceso y por NOTIFY en los demás (versiones.py); el TTL
+# acota cuánto puede durar un dato viejo si un aviso se pierde o la base no
+# es PostgreSQL y escribe otro proceso.
+DISPONIBILIDAD_CACHE_TTL = float(os.environ.get('DISPONIBILIDAD_CACHE_TTL', 30))
+cache_disponibilidad = CacheLRU(int(os.environ.get('DISPONIBILIDAD_CACHE_MAX', 2048)), ttl=DISPONIBILIDAD_CACHE_TTL)
+
+# Snapshot de estadísticas del dashboard (0 = sin caché)
+DASHBOARD_CACHE_TTL = float(os.environ.get('DASHBOARD_CACHE_TTL', 0))
+cache_dashboard = CacheLRU(capacidad=1, ttl=DASHBOARD_CACHE_TTL)
+
+def invalidar_disponibilidad(cancha_id, fecha):
+    """Descarta la disponibilidad cacheada de una cancha en un día"""
+    if isinstance(fecha, datetime):
+        fecha = fecha.date()
+    cache_disponibilidad.invalidar((int(cancha_id), fecha))
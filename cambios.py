@@ -0,0 +1,65 @@
+from collections import namedtuple
+from sqlalchemy import event
+from database import Session
+from cache import invalidar_disponibilidad
+from eventos import evento_turno, notificar as notificar_eventos, publicar_local
+from resumen import COLUMNAS_ESTADO, aplicar_cambios
+from versiones import notificar as notificar_versiones, versiones
+
+# Alta o cambio de estado de una reserva (estado_anterior=None en un alta)
+Cambio = namedtuple(
+    'Cambio',
+    ['cancha_id', 'fecha', 'estado_anterior', 'estado_nuevo', 'monto', 'horario', 'reserva_id'],
+    defaults=(None, None)
+)
+
+def registrar_cambio(session_db, cancha_id, fecha, estado_anterior, estado_nuevo, monto,
+                     horario=None, reserva_id=None):
+    """Registra el alta o cambio de estado de una reserva en la transacción en curso.
+
+    El resumen diario se ajusta dentro de la misma transacción; las
+    invalidaciones de caché y de versiones quedan pendientes hasta el
+    commit. Con 'horario' también se emite el evento de turno ocupado o
+    liberado (ver eventos.py).
+    """
+    registrar_cambios(session_db, [
+        Cambio(cancha_id, fecha, estado_anterior, estado_nuevo, monto, horario, reserva_id)
+    ])
+
+def registrar_cambios(session_db, cambios):
+    """Como registrar_cambio() para varias reservas, con un solo upsert del resumen;
+    'cambios' son Cambio o tuplas con sus mismos campos.
+
+    Lanza ValueError, antes de tocar el resumen, si algún estado nuevo no es
+    uno de los conocidos: un None se contaría como la baja de la reserva.
+    """
+    cambios = [Cambio(*cambio) for cambio in cambios]
+    for cambio in cambios:
+        if cambio.estado_nuevo not in COLUMNAS_ESTADO:
+            raise ValueError(f"Estado de reserva desconocido: {cambio.estado_nuevo!r}")
+    aplicar_cambios(session_db, cambios)
+
+    dias = list(dict.fromkeys((cambio.cancha_id, cambio.fecha) for cambio in cambios))
+    reservas = [cambio.reserva_id for cambio in cambios if cambio.reserva_id is not None]
+    session_db.info.setdefault('cambios_reserva', []).extend(dias)
+    session_db.info.setdefault('reservas_modificadas', []).extend(reservas)
+    notificar_versiones(session_db, dias, reservas)
+
+    eventos = [
+        evento_turno(cambio.cancha_id, cambio.fecha, cambio.horario, cambio.estado_anterior, cambio.estado_nuevo)
+        for cambio in cambios
+    ]
+    notificar_eventos(session_db, [evento for evento in eventos if evento])
+
+@event.listens_for(Session, 'after_commit')
+def _despues_del_commit(session_db):
+    dias = session_db.info.pop('cambios_reserva', [])
+    for cancha_id, fecha in dias:
+        invalidar_disponibilidad(cancha_id, fecha)
+    versiones.incrementar(dias, session_db.info.pop('reservas_modificadas', []))
+    publicar_local(session_db.info.pop('eventos_disponibilidad', []))
+
+@event.listens_for(Session, 'after_rollback')
+def _despues_del_rollback(session_db):
+    for clave in ('cambios_reserva', 'reservas_modificadas', 'eventos_disponibilidad'):
+        session_db.info.pop(clave, None)
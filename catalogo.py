@@ -0,0 +1,144 @@
+import asyncio
+import os
+import threading
+import time
+from collections import namedtuple
+from sqlalchemy import event, select
+from database import Session, Cancha
+
+# Copia inmutable de una fila de canchas, segura de compartir entre hilos
+CanchaInfo = namedtuple('CanchaInfo', ['id', 'nombre', 'tipo', 'precio_hora', 'activa'])
+
+class CatalogoCanchas:
+    """Canchas y precios en memoria, con número de versión.
+
+    Se carga una vez y se recarga al vencer el TTL o cuando se edita una
+    cancha; la versión sólo aumenta si el contenido cambió. La consulta
+    corre sin tomar el lock: un solo hilo recarga y los demás siguen con la
+    copia anterior (sólo esperan en la primera carga, cuando no hay copia).
+
+    La app ASGI usa las variantes *_async, que consultan con la sesión
+    asíncrona: nunca esperan un lock de hilos con una consulta en curso.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.version = 0
+        self._canchas = None
+        self._cargado = 0.0
+        self._cargando = False
+        self._generacion = 0
+        self._condicion = threading.Condition()
+        self._lock_async = asyncio.Lock()
+
+    def _vigente(self):
+        return self._canchas is not None and time.monotonic() - self._cargado < self.ttl
+
+    @staticmethod
+    def _info(cancha):
+        return CanchaInfo(cancha.id, cancha.nombre, cancha.tipo, cancha.precio_hora, bool(cancha.activa))
+
+    def _leer(self, session_db):
+        propia = session_db is None
+        if propia:
+            session_db = Session()
+        try:
+            return tuple(self._info(c) for c in session_db.query(Cancha).order_by(Cancha.id))
+        finally:
+            if propia:
+                session_db.close()
+
+    def _instalar(self, canchas, generacion):
+        """Publica lo leído; si se invalidó durante la lectura, queda vencido"""
+        with self._condicion:
+            if canchas != self._canchas:
+                self.version += 1
+            self._canchas = canchas
+            self._cargado = time.monotonic() if generacion == self._generacion else 0.0
+
+    def todas(self, session_db=None):
+        """Todas las canchas; 'session_db' sólo se usa si hay que recargar"""
+        if self._vigente():
+            return self._canchas
+        with self._condicion:
+            while True:
+                if self._vigente():
+                    return self._canchas
+                if not self._cargando:
+                    break
+                if self._canchas is not None:
+                    # Otro hilo ya recarga
+                    return self._canchas
+                self._condicion.wait()
+            self._cargando = True
+            generacion = self._generacion
+
+        try:
+            self._instalar(self._leer(session_db), generacion)
+        finally:
+            with self._condicion:
+                self._cargando = False
+                self._condicion.notify_all()
+        return self._canchas
+
+    def activas(self, session_db=None):
+        return [cancha for cancha in self.todas(session_db) if cancha.activa]
+
+    def obtener(self, cancha_id, session_db=None):
+        for cancha in self.todas(session_db):
+            if cancha.id == cancha_id:
+                return cancha
+        return None
+
+    async def _leer_async(self, sesion):
+        return tuple(self._info(c) for c in await sesion.scalars(select(Cancha).order_by(Cancha.id)))
+
+    async def todas_async(self, sesion):
+        """Como todas(), con una sesión asíncrona; una sola corrutina recarga
+        y las demás siguen con la copia anterior mientras tanto"""
+        if self._vigente() or (self._lock_async.locked() and self._canchas is not None):
+            return self._canchas
+        async with self._lock_async:
+            if not self._vigente():
+                generacion = self._generacion
+                self._instalar(await self._leer_async(sesion), generacion)
+        return self._canchas
+
+    async def activas_async(self, sesion):
+        return [cancha for cancha in await self.todas_async(sesion) if cancha.activa]
+
+    async def obtener_async(self, cancha_id, sesion):
+        for cancha in await self.todas_async(sesion):
+            if cancha.id == cancha_id:
+                return cancha
+        return None
+
+    def invalidar(self):
+        with self._condicion:
+            self._generacion += 1
+            self._cargado = 0.0
+
+    def estadisticas(self):
+        return {
+            'version': self.version,
+            'canchas': len(self._canchas or ()),
+            'ttl': self.ttl,
+            'edad_segundos': round(time.monotonic() - self._cargado, 1) if self._canchas is not None else None
+        }
+
+catalogo_canchas = CatalogoCanchas(ttl=float(os.environ.get('CATALOGO_TTL', 300)))
+
+@event.listens_for(Session, 'after_flush')
+def _detectar_cambios_canchas(session_db, contexto):
+    modificadas = (session_db.new | session_db.dirty | session_db.deleted)
+    if any(isinstance(objeto, Cancha) for objeto in modificadas):
+        session_db.info['catalogo_modificado'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _recargar_catalogo(session_db):
+    if session_db.info.pop('catalogo_modificado', False):
+        catalogo_canchas.invalidar()
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_cambios_canchas(session_db):
+    session_db.info.pop('catalogo_modificado', None)
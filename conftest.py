@@ -0,0 +1,46 @@
+"""Entorno de las pruebas: una base SQLite temporal y sin hilos de fondo.
+
+Las variables se fijan antes de importar la app, porque database.py crea
+el engine y app.py arranca la cola de tareas y el vencimiento al importarse.
+"""
+import os
+import tempfile
+
+_directorio = tempfile.mkdtemp(prefix='complejo_pruebas_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_directorio, 'pruebas.db')}"
+os.environ.pop('REPLICA_URL', None)
+os.environ['TAREAS_HILOS'] = '0'
+os.environ['VENCIMIENTO_INTERVALO'] = '0'
+os.environ['NOTIFICADOR'] = 'falso'
+
+import pytest
+
+# Script manual contra un PostgreSQL local, no una prueba automática
+collect_ignore = ['test_sistema.py']
+
+@pytest.fixture
+def base():
+    """Base vacía con las canchas de ejemplo"""
+    import database
+    from cache import cache_dashboard, cache_disponibilidad
+    from catalogo import catalogo_canchas
+
+    database.Base.metadata.drop_all(database.engine)
+    database.init_db()
+    database.insertar_datos_ejemplo()
+    cache_disponibilidad.limpiar()
+    cache_dashboard.limpiar()
+    catalogo_canchas.invalidar()
+    return database
+
+@pytest.fixture
+def cliente(base):
+    from app import app
+    app.testing = True
+    return app.test_client()
+
+@pytest.fixture
+def admin(cliente):
+    from admin import ADMIN_PASSWORD
+    cliente.post('/admin/login', json={'password': ADMIN_PASSWORD})
+    return cliente
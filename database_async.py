@@ -0,0 +1,37 @@
+"""Acceso asíncrono a la base para la app ASGI (app_async.py).
+
+Usa los mismos modelos y la misma DATABASE_URL que la app síncrona, con el
+driver asíncrono del dialecto (asyncpg en PostgreSQL, aiosqlite en SQLite).
+"""
+import os
+from sqlalchemy import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from database import DATABASE_URL, POOL_CONFIG, Session
+
+# Driver asíncrono de cada dialecto
+DRIVERS_ASYNC = {
+    'postgresql': 'asyncpg',
+    'sqlite': 'aiosqlite'
+}
+
+def url_async(url):
+    """La URL de la base con el driver asíncrono de su dialecto"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in DRIVERS_ASYNC:
+        raise ValueError(f"Sin driver asíncrono para '{backend}'")
+    return url.set(drivername=f"{backend}+{DRIVERS_ASYNC[backend]}")
+
+def crear_engine_async(url, **opciones):
+    """Engine asíncrono con el mismo pool configurado que el síncrono"""
+    url = url_async(url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return create_async_engine(url, echo=False, **opciones)
+    return create_async_engine(url, echo=False, **POOL_CONFIG, **opciones)
+
+engine_async = crear_engine_async(os.environ.get('ASYNC_DATABASE_URL', DATABASE_URL))
+
+# Las sesiones asíncronas envuelven la misma clase de sesión que 'Session',
+# así los listeners de cambios.py y catalogo.py también corren en la app ASGI.
+# Sin expirar en el commit para no disparar cargas implícitas fuera de un await.
+SesionAsync = async_sessionmaker(engine_async, sync_session_class=Session.class_, expire_on_commit=False)
@@ -0,0 +1,100 @@
+from sqlalchemy import Date, func, select
+from database import Reserva, ESTADOS_ACTIVOS
+from datetime import timedelta
+from horarios import HORARIOS, indices, inicios_libres, mascara, cadena
+
+# Límite de días por consulta de la matriz
+MAX_DIAS = 31
+
+def rango_fechas(desde, dias):
+    """Lista de fechas consecutivas a partir de 'desde'"""
+    return [desde + timedelta(days=i) for i in range(dias)]
+
+def consulta_horarios_ocupados(cancha_id, fecha):
+    """SELECT de los horarios activos de una cancha en un día; sirve tanto
+    para la sesión síncrona como para la asíncrona"""
+    return select(Reserva.horario).where(
+        Reserva.cancha_id == cancha_id,
+        Reserva.fecha_reserva >= fecha,
+        Reserva.fecha_reserva < fecha + timedelta(days=1),
+        Reserva.estado.in_(ESTADOS_ACTIVOS)
+    )
+
+def consulta_turnos_ocupados(cancha_id, turnos):
+    """SELECT (día, horario) de las reservas activas de una cancha en el rango
+    de fechas de los 'turnos' (fecha, horario): una sola consulta que puede
+    devolver de más; filtrar el resultado con horarios.normalizar()"""
+    fechas = [fecha for fecha, _ in turnos]
+    return select(func.date(Reserva.fecha_reserva, type_=Date), Reserva.horario).where(
+        Reserva.cancha_id == cancha_id,
+        Reserva.fecha_reserva >= min(fechas),
+        Reserva.fecha_reserva < max(fechas) + timedelta(days=1),
+        Reserva.estado.in_(ESTADOS_ACTIVOS)
+    )
+
+def consulta_ocupados(session_db, desde, hasta, cancha_ids=None):
+    """Consulta agrupada (cancha_id, día, horario) de las reservas activas"""
+    dia = func.date(Reserva.fecha_reserva, type_=Date)
+
+    query = session_db.query(Reserva.cancha_id, dia, Reserva.horario).filter(
+        Reserva.fecha_reserva >= desde,
+        Reserva.fecha_reserva < hasta,
+        Reserva.estado.in_(ESTADOS_ACTIVOS)
+    )
+    if cancha_ids:
+        query = query.filter(Reserva.cancha_id.in_(cancha_ids))
+    return query.group_by(Reserva.cancha_id, dia, Reserva.horario)
+
+def consultar_ocupados(session_db, desde, hasta, cancha_ids=None):
+    """Máscara de turnos ocupados (ver horarios.py) por (cancha_id, fecha) entre
+    'desde' y 'hasta' (exclusivo), resuelta con una sola consulta agrupada"""
+    ocupados = {}
+    for cancha_id, fecha, horario in consulta_ocupados(session_db, desde, hasta, cancha_ids):
+        ocupados[(cancha_id, fecha)] = ocupados.get((cancha_id, fecha), 0) | mascara([horario])
+    return ocupados
+
+def canchas_libres(session_db, canchas, fecha, horas=1, horario=None):
+    """Turnos de 'fecha' donde cada cancha tiene 'horas' turnos libres seguidos.
+
+    Con 'horario' sólo se considera ese turno de inicio, lo que responde
+    "qué canchas están libres a las 20:00". Devuelve una lista de
+    {'id', 'nombre', 'inicios'} con las canchas que tienen algún inicio.
+    """
+    ocupados = consultar_ocupados(session_db, fecha, fecha + timedelta(days=1), [c.id for c in canchas])
+    filtro = mascara([horario]) if horario is not None else ~0
+
+    resultado = []
+    for cancha in canchas:
+        inicios = inicios_libres(ocupados.get((cancha.id, fecha), 0), horas) & filtro
+        if inicios:
+            resultado.append({
+                'id': cancha.id,
+                'nombre': cancha.nombre,
+                'inicios': [HORARIOS[i] for i in indices(inicios)]
+            })
+    return resultado
+
+def matriz_disponibilidad(session_db, canchas, desde, dias):
+    """Matriz cancha × día × horario en formato compacto.
+
+    Cada cancha tiene una cadena por día con un carácter por horario
+    de HORARIOS: '1' ocupado, '0' libre.
+    """
+    fechas = rango_fechas(desde, dias)
+    ocupados = consultar_ocupados(
+        session_db, desde, desde + timedelta(days=dias), [c.id for c in canchas]
+    )
+
+    ocupacion = {}
+    for cancha in canchas:
+        ocupacion[str(cancha.id)] = [
+            cadena(ocupados.get((cancha.id, f), 0)) for f in fechas
+        ]
+
+    return {
+        'desde': desde.isoformat(),
+        'fechas': [f.isoformat() for f in fechas],
+        'horarios': HORARIOS,
+        'canchas': [{'id': c.id, 'nombre': c.nombre} for c in canchas],
+        'ocupacion': ocupacion
+    }
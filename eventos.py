@@ -0,0 +1,203 @@
+"""Eventos de disponibilidad: un turno se ocupó o se liberó.
+
+Las escrituras los generan a través de cambios.registrar_cambios(). En
+PostgreSQL viajan con pg_notify dentro de la misma transacción, así sólo se
+entregan si confirma y llegan a todos los procesos; con otros motores se
+publican en el proceso actual después del commit.
+
+La app ASGI los reparte a las páginas abiertas por Server-Sent Events con
+un DifusorEventos: una cola asyncio por conexión, sin un hilo por cliente.
+"""
+import asyncio
+import json
+import logging
+import threading
+from sqlalchemy import func, make_url, select
+from database import ESTADOS_ACTIVOS
+from horarios import normalizar
+
+# Canal de LISTEN/NOTIFY en PostgreSQL
+CANAL = 'disponibilidad'
+
+# Eventos por NOTIFY: el payload de PostgreSQL admite menos de 8000 bytes
+EVENTOS_POR_NOTIFY = 40
+
+# Eventos sin leer por conexión antes de pedirle que recargue
+CAPACIDAD_COLA = 100
+
+# Espera (segundos) antes de reconectar el LISTEN, que se duplica hasta el máximo
+RECONEXION_ESPERA = 1
+RECONEXION_ESPERA_MAX = 30
+
+# Segundos sin avisos tras los que se comprueba que la conexión siga viva
+LISTEN_SONDEO = 30
+
+log = logging.getLogger('complejo.eventos')
+
+def evento_turno(cancha_id, fecha, horario, estado_anterior, estado_nuevo):
+    """Evento 'ocupado' o 'liberado' del cambio de estado, o None si el turno
+    sigue igual (por ejemplo, de pendiente a confirmada)"""
+    ocupaba = estado_anterior in ESTADOS_ACTIVOS
+    ocupa = estado_nuevo in ESTADOS_ACTIVOS
+    if horario is None or ocupaba == ocupa:
+        return None
+    return {
+        'tipo': 'ocupado' if ocupa else 'liberado',
+        'cancha_id': int(cancha_id),
+        'fecha': (fecha.date() if hasattr(fecha, 'date') else fecha).isoformat(),
+        'horario': normalizar(horario)
+    }
+
+# Funciones que reciben cada evento publicado en este proceso
+_oyentes = []
+_lock_oyentes = threading.Lock()
+
+def agregar_oyente(oyente):
+    with _lock_oyentes:
+        _oyentes.append(oyente)
+
+def quitar_oyente(oyente):
+    with _lock_oyentes:
+        if oyente in _oyentes:
+            _oyentes.remove(oyente)
+
+def publicar_local(eventos):
+    with _lock_oyentes:
+        oyentes = list(_oyentes)
+    for evento in eventos:
+        for oyente in oyentes:
+            oyente(evento)
+
+def notificar(session_db, eventos):
+    """Emite 'eventos' como parte de la transacción en curso"""
+    if not eventos:
+        return
+    if session_db.get_bind().dialect.name == 'postgresql':
+        for i in range(0, len(eventos), EVENTOS_POR_NOTIFY):
+            carga = json.dumps(eventos[i:i + EVENTOS_POR_NOTIFY], separators=(',', ':'))
+            session_db.execute(select(func.pg_notify(CANAL, carga)))
+    else:
+        # cambios.py los publica tras el commit y los descarta si hay rollback
+        session_db.info.setdefault('eventos_disponibilidad', []).extend(eventos)
+
+class DifusorEventos:
+    """Reparte los eventos a las conexiones SSE suscritas a cada fecha.
+
+    Vive en el event loop de la app ASGI; publicar() puede llamarse desde
+    cualquier hilo.
+    """
+
+    def __init__(self, capacidad=CAPACIDAD_COLA):
+        self.capacidad = capacidad
+        self._colas = {}
+        self._loop = None
+        self._conexion = None
+        self._escucha = None
+        self.entregados = 0
+        self.desbordes = 0
+        self.reconexiones = 0
+
+    def suscribir(self, fecha):
+        cola = asyncio.Queue(maxsize=self.capacidad)
+        self._colas.setdefault(fecha.isoformat(), set()).add(cola)
+        return cola
+
+    def desuscribir(self, fecha, cola):
+        colas = self._colas.get(fecha.isoformat())
+        if colas is not None:
+            colas.discard(cola)
+            if not colas:
+                del self._colas[fecha.isoformat()]
+
+    def _entregar(self, evento):
+        for cola in self._colas.get(evento['fecha'], ()):
+            try:
+                cola.put_nowait(evento)
+            except asyncio.QueueFull:
+                # Cliente lento: descartar lo pendiente y pedirle que recargue
+                self.desbordes += 1
+                while not cola.empty():
+                    cola.get_nowait()
+                cola.put_nowait({'tipo': 'recargar', 'fecha': evento['fecha']})
+            else:
+                self.entregados += 1
+
+    def _recargar_todo(self):
+        # Tras un corte no se sabe qué cambió: todas las páginas vuelven a consultar
+        for fecha in list(self._colas):
+            self._entregar({'tipo': 'recargar', 'fecha': fecha})
+
+    def publicar(self, evento):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._entregar, evento)
+
+    def _al_notificar(self, conexion, pid, canal, carga):
+        for evento in json.loads(carga):
+            self._entregar(evento)
+
+    async def iniciar(self, url):
+        """Empieza a recibir eventos: por LISTEN si la base es PostgreSQL,
+        si no, de las escrituras de este mismo proceso"""
+        self._loop = asyncio.get_running_loop()
+        url = make_url(url)
+        if url.get_backend_name() == 'postgresql':
+            dsn = url.set(drivername='postgresql').render_as_string(hide_password=False)
+            self._escucha = asyncio.create_task(self._escuchar(dsn))
+        else:
+            agregar_oyente(self.publicar)
+
+    async def _escuchar(self, dsn):
+        """Mantiene el LISTEN: si la conexión se corta, reconecta con espera
+        creciente y pide a todas las páginas que recarguen"""
+        import asyncpg
+        espera = RECONEXION_ESPERA
+        cortada = False
+        while True:
+            conexion = None
+            try:
+                terminada = asyncio.Event()
+                conexion = await asyncpg.connect(dsn)
+                conexion.add_termination_listener(lambda _: terminada.set())
+                await conexion.add_listener(CANAL, self._al_notificar)
+                self._conexion = conexion
+                espera = RECONEXION_ESPERA
+                if cortada:
+                    self.reconexiones += 1
+                    self._recargar_todo()
+                while not terminada.is_set():
+                    try:
+                        await asyncio.wait_for(terminada.wait(), LISTEN_SONDEO)
+                    except asyncio.TimeoutError:
+                        # Un corte de red puede no cerrar el socket: comprobarlo
+                        await asyncio.wait_for(conexion.fetchval('SELECT 1'), LISTEN_SONDEO)
+                log.warning("Conexión LISTEN de eventos cerrada; reconectando")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Escucha de eventos interrumpida; reintentando en %s s", espera)
+            finally:
+                self._conexion = None
+                if conexion is not None and not conexion.is_closed():
+                    conexion.terminate()
+            cortada = True
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, RECONEXION_ESPERA_MAX)
+
+    async def detener(self):
+        quitar_oyente(self.publicar)
+        if self._escucha is not None:
+            self._escucha.cancel()
+            try:
+                await self._escucha
+            except asyncio.CancelledError:
+                pass
+            self._escucha = None
+
+    def estadisticas(self):
+        return {
+            'fechas': len(self._colas),
+            'conexiones': sum(len(colas) for colas in self._colas.values()),
+            'entregados': self.entregados,
+            'desbordes': self.desbordes,
+            'reconexiones': self.reconexiones
+        }
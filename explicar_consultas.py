@@ -0,0 +1,98 @@
+"""Imprime el plan de ejecución de cada consulta frecuente de la app.
+
+En PostgreSQL usa EXPLAIN ANALYZE; en SQLite, EXPLAIN QUERY PLAN. Las
+escrituras se ejecutan dentro de una transacción que se deshace al final.
+Marca con ⚠️ las consultas que recorren la tabla reservas completa.
+"""
+from datetime import date, datetime, timedelta
+from database import engine, Session, Reserva
+from disponibilidad import consulta_horarios_ocupados, consulta_ocupados, consulta_turnos_ocupados
+from reportes import consulta_reporte, consulta_resumen
+from reservas import upsert_cliente
+from retencion import RETENCION_DIAS, RETENCION_LOTE, consulta_lote
+from tareas import consulta_reclamar
+from vencimiento import PENDIENTE_TTL_MINUTOS, consulta_vencimiento
+from admin import (_condiciones_filtros, _consulta_cambio_estado, _consulta_contadores_dashboard,
+                   _consulta_pagina_reservas, _consulta_reservas_dia, _consulta_ultimas_reservas,
+                   _filtros_lote, _id_en)
+
+def _filtros(**cambios):
+    filtros = {'estado': 'todas', 'cancha_id': None, 'metodo_pago': '', 'desde': '', 'hasta': '', 'fecha': ''}
+    filtros.update(cambios)
+    return filtros
+
+def consultas(session_db):
+    """(nombre, consulta) de cada consulta que emite la app, armada con las
+    mismas funciones que usan los endpoints"""
+    hoy = date.today()
+    manana = hoy + timedelta(days=1)
+    cursor = f"{datetime.combine(hoy, datetime.min.time()).isoformat()},1000000"
+    cliente = {'cedula': '0', 'nombre': 'Plan', 'apellido': 'Consulta', 'telefono': '0', 'email': ''}
+    filtro_lote, _ = _filtros_lote({'estado': 'pendiente', 'fecha': hoy.isoformat()})
+
+    return [
+        ("/disponibilidad", consulta_horarios_ocupados(1, hoy)),
+        ("/disponibilidad/matriz", consulta_ocupados(session_db, hoy, hoy + timedelta(days=14))),
+        ("/reservar: cliente (upsert)", upsert_cliente(session_db, cliente)),
+        ("/reservar/lote: turnos ocupados", consulta_turnos_ocupados(
+            1, [(hoy, '17:00 - 18:00'), (hoy + timedelta(days=28), '17:00 - 18:00')]
+        )),
+        ("/admin/reservas", _consulta_pagina_reservas(session_db, _filtros())),
+        ("/admin/reservas (cursor)", _consulta_pagina_reservas(session_db, _filtros(), cursor)),
+        ("/admin/reservas (estado + rango)", _consulta_pagina_reservas(
+            session_db, _filtros(estado='pendiente', desde=hoy.isoformat(), hasta=hoy.isoformat())
+        )),
+        ("/admin/reservas (cancha)", _consulta_pagina_reservas(session_db, _filtros(cancha_id=1))),
+        ("/admin/actualizar_estado_lote (ids)", _consulta_cambio_estado(
+            [_id_en(session_db, [1, 2, 3]), Reserva.estado == 'pendiente'], 'confirmada'
+        )),
+        ("/admin/actualizar_estado_lote (filtro)", _consulta_cambio_estado(
+            [*_condiciones_filtros(filtro_lote), Reserva.estado == 'pendiente'], 'confirmada'
+        )),
+        ("/admin/dashboard: contadores", _consulta_contadores_dashboard(session_db)),
+        ("/admin/dashboard: últimas reservas", _consulta_ultimas_reservas(session_db)),
+        ("/admin/reporte_diario", _consulta_reservas_dia(session_db, hoy)),
+        ("/admin/reporte (por mes)", consulta_reporte(session_db, hoy - timedelta(days=180), manana, 'mes')),
+        ("/admin/reporte?fuente=resumen", consulta_resumen(session_db, hoy - timedelta(days=180), manana, 'mes')),
+        ("retención: lote", consulta_lote(hoy - timedelta(days=RETENCION_DIAS), RETENCION_LOTE)),
+        # Usa ix_reservas_pendientes_creacion
+        ("vencimiento de pendientes", consulta_vencimiento(
+            datetime.now() - timedelta(minutes=PENDIENTE_TTL_MINUTOS)
+        )),
+        ("tareas: reclamar la siguiente", consulta_reclamar(datetime.now())),
+    ]
+
+def _sql(consulta):
+    statement = getattr(consulta, 'statement', consulta)
+    return str(statement.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+
+def _recorre_tabla(plan, dialecto):
+    if dialecto == 'postgresql':
+        return any('Seq Scan on reservas' in linea for linea in plan)
+    return any(linea.startswith('SCAN reservas') and 'INDEX' not in linea for linea in plan)
+
+def explicar():
+    dialecto = engine.dialect.name
+    prefijo = 'EXPLAIN ANALYZE' if dialecto == 'postgresql' else 'EXPLAIN QUERY PLAN'
+
+    session_db = Session()
+    try:
+        for nombre, consulta in consultas(session_db):
+            sql = _sql(consulta)
+            filas = session_db.connection().exec_driver_sql(f"{prefijo} {sql}").fetchall()
+            plan = [str(fila[0]) if dialecto == 'postgresql' else str(fila[-1]) for fila in filas]
+
+            marca = "⚠️ " if _recorre_tabla(plan, dialecto) else "✅"
+            print("=" * 70)
+            print(f"{marca} {nombre}")
+            print("-" * 70)
+            print(sql)
+            print("-" * 70)
+            for linea in plan:
+                print(linea)
+        session_db.rollback()
+    finally:
+        session_db.close()
+
+if __name__ == "__main__":
+    explicar()
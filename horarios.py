@@ -0,0 +1,79 @@
+"""Turnos del complejo como índices enteros.
+
+El turno i es la hora HORA_APERTURA + i; la ocupación de una cancha en un
+día es una máscara de bits con el bit i encendido si el turno i está
+tomado. Disponibilidad, búsqueda de horas seguidas y "qué cancha está libre
+a las 20:00" se resuelven con operaciones de bits.
+
+En la base los turnos siguen guardándose como texto ("17:00 - 18:00");
+indice() también acepta las variantes de escritura de reservas anteriores.
+"""
+import re
+
+HORA_APERTURA = 17
+HORA_CIERRE = 23
+
+HORARIOS = [f"{hora}:00 - {hora + 1}:00" for hora in range(HORA_APERTURA, HORA_CIERRE)]
+
+CANTIDAD = len(HORARIOS)
+
+# Máscara con todos los turnos ocupados
+COMPLETA = (1 << CANTIDAD) - 1
+
+_INDICES = {horario: i for i, horario in enumerate(HORARIOS)}
+
+# "17:00 - 18:00", "17:00-18:00", "17:00", "17"...: sólo importa la hora de inicio
+_HORA_INICIO = re.compile(r'^\s*(\d{1,2})(?::00)?\s*(?:-.*)?$')
+
+def indice(horario):
+    """Índice del turno, o None si 'horario' no es un turno del complejo"""
+    if isinstance(horario, int):
+        return horario if 0 <= horario < CANTIDAD else None
+    if horario in _INDICES:
+        return _INDICES[horario]
+    coincidencia = _HORA_INICIO.match(str(horario))
+    if not coincidencia:
+        return None
+    return indice(int(coincidencia.group(1)) - HORA_APERTURA)
+
+def normalizar(horario):
+    """Texto canónico del turno; si no es un turno conocido, el mismo valor"""
+    i = indice(horario)
+    return HORARIOS[i] if i is not None else horario
+
+def mascara(horarios):
+    """Máscara de una colección de turnos (texto o índices); ignora los desconocidos"""
+    bits = 0
+    for horario in horarios:
+        i = indice(horario)
+        if i is not None:
+            bits |= 1 << i
+    return bits
+
+def indices(bits):
+    return [i for i in range(CANTIDAD) if bits >> i & 1]
+
+def horarios_de(bits):
+    """Turnos (texto) de una máscara, en orden"""
+    return [HORARIOS[i] for i in indices(bits)]
+
+def libres(ocupados):
+    return COMPLETA & ~ocupados
+
+def inicios_libres(ocupados, horas=1):
+    """Máscara de los turnos donde empiezan 'horas' turnos libres seguidos"""
+    if not 1 <= horas <= CANTIDAD:
+        return 0
+    disponibles = libres(ocupados)
+    inicios = disponibles
+    for desplazamiento in range(1, horas):
+        inicios &= disponibles >> desplazamiento
+    return inicios
+
+def esta_libre(ocupados, inicio, horas=1):
+    """Si los 'horas' turnos desde 'inicio' están libres"""
+    return bool(inicios_libres(ocupados, horas) >> inicio & 1)
+
+def cadena(bits):
+    """Un carácter por turno: '1' ocupado, '0' libre (formato de la matriz)"""
+    return ''.join('1' if bits >> i & 1 else '0' for i in range(CANTIDAD))
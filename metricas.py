@@ -0,0 +1,223 @@
+"""Métricas por petición: latencia, cantidad de consultas SQL y tiempo en la base.
+
+Los eventos del engine cuentan y cronometran cada sentencia de la petición
+en curso (en flask.g); los hooks de Flask cierran la medición y la acumulan
+por endpoint. GET /metrics las expone en formato de texto de Prometheus.
+
+Con SLOW_REQUEST_MS > 0, las peticiones más lentas que ese umbral se
+registran en el logger 'complejo.lentas' junto con las sentencias emitidas.
+"""
+import logging
+import os
+import threading
+import time
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+# Límites (segundos) de los buckets de latencia
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Límites de los buckets de consultas por petición
+BUCKETS_CONSULTAS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+# Umbral del log de peticiones lentas (0 = desactivado)
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 0))
+
+# Sentencias guardadas por petición para el log de lentas
+MAX_SENTENCIAS_LOG = 50
+
+log_lentas = logging.getLogger('complejo.lentas')
+
+class Histograma:
+    """Histograma acumulativo al estilo Prometheus"""
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.conteos = [0] * len(limites)
+        self.cantidad = 0
+        self.suma = 0.0
+
+    def observar(self, valor):
+        self.cantidad += 1
+        self.suma += valor
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.conteos[i] += 1
+
+class MetricasPeticiones:
+    """Acumulados por endpoint, seguros para varios hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.peticiones = {}
+        self.latencias = {}
+        self.consultas = {}
+        self.consultas_total = {}
+        self.tiempo_db = {}
+
+    def registrar(self, endpoint, metodo, estado, duracion, consultas, tiempo_db):
+        with self._lock:
+            clave = (endpoint, metodo, str(estado))
+            self.peticiones[clave] = self.peticiones.get(clave, 0) + 1
+            self.latencias.setdefault(endpoint, Histograma(BUCKETS_LATENCIA)).observar(duracion)
+            self.consultas.setdefault(endpoint, Histograma(BUCKETS_CONSULTAS)).observar(consultas)
+            self.consultas_total[endpoint] = self.consultas_total.get(endpoint, 0) + consultas
+            self.tiempo_db[endpoint] = self.tiempo_db.get(endpoint, 0.0) + tiempo_db
+
+metricas_peticiones = MetricasPeticiones()
+
+def _etiquetas(**valores):
+    return ','.join(f'{nombre}="{str(valor).replace(chr(34), "")}"' for nombre, valor in valores.items())
+
+def _lineas_histograma(nombre, histograma, **etiquetas):
+    base = _etiquetas(**etiquetas)
+    for limite, conteo in zip(histograma.limites, histograma.conteos):
+        yield f'{nombre}_bucket{{{base},le="{limite}"}} {conteo}'
+    yield f'{nombre}_bucket{{{base},le="+Inf"}} {histograma.cantidad}'
+    yield f'{nombre}_sum{{{base}}} {round(histograma.suma, 6)}'
+    yield f'{nombre}_count{{{base}}} {histograma.cantidad}'
+
+def _lineas_peticiones(metricas):
+    with metricas._lock:
+        yield '# HELP complejo_http_peticiones_total Peticiones atendidas'
+        yield '# TYPE complejo_http_peticiones_total counter'
+        for (endpoint, metodo, estado), total in sorted(metricas.peticiones.items()):
+            yield f'complejo_http_peticiones_total{{{_etiquetas(endpoint=endpoint, metodo=metodo, estado=estado)}}} {total}'
+
+        yield '# HELP complejo_http_duracion_segundos Latencia de las peticiones'
+        yield '# TYPE complejo_http_duracion_segundos histogram'
+        for endpoint, histograma in sorted(metricas.latencias.items()):
+            yield from _lineas_histograma('complejo_http_duracion_segundos', histograma, endpoint=endpoint)
+
+        yield '# HELP complejo_db_consultas_por_peticion Sentencias SQL por petición'
+        yield '# TYPE complejo_db_consultas_por_peticion histogram'
+        for endpoint, histograma in sorted(metricas.consultas.items()):
+            yield from _lineas_histograma('complejo_db_consultas_por_peticion', histograma, endpoint=endpoint)
+
+        yield '# HELP complejo_db_consultas_total Sentencias SQL emitidas'
+        yield '# TYPE complejo_db_consultas_total counter'
+        for endpoint, total in sorted(metricas.consultas_total.items()):
+            yield f'complejo_db_consultas_total{{{_etiquetas(endpoint=endpoint)}}} {total}'
+
+        yield '# HELP complejo_db_tiempo_segundos_total Tiempo esperando a la base'
+        yield '# TYPE complejo_db_tiempo_segundos_total counter'
+        for endpoint, total in sorted(metricas.tiempo_db.items()):
+            yield f'complejo_db_tiempo_segundos_total{{{_etiquetas(endpoint=endpoint)}}} {round(total, 6)}'
+
+def _lineas_pool(engine):
+    from database import estado_pool
+    estado = estado_pool(engine)
+    for clave in ('tamano', 'en_uso', 'disponibles', 'overflow'):
+        if clave in estado:
+            yield f'# TYPE complejo_db_pool_{clave} gauge'
+            yield f'complejo_db_pool_{clave} {estado[clave]}'
+    metricas = getattr(engine.pool, 'metricas', None)
+    if metricas is not None:
+        for clave in ('checkouts', 'timeouts', 'conexiones_creadas'):
+            yield f'# TYPE complejo_db_pool_{clave}_total counter'
+            yield f'complejo_db_pool_{clave}_total {getattr(metricas, clave)}'
+        yield '# TYPE complejo_db_pool_espera_segundos_total counter'
+        yield f'complejo_db_pool_espera_segundos_total {round(metricas.espera_total, 6)}'
+
+def _lineas_caches():
+    from cache import cache_dashboard, cache_disponibilidad
+    caches = {'disponibilidad': cache_disponibilidad, 'dashboard': cache_dashboard}
+    for campo, tipo in (('aciertos', 'counter'), ('fallos', 'counter'), ('desalojos', 'counter'), ('entradas', 'gauge')):
+        nombre = f'complejo_cache_{campo}' + ('_total' if tipo == 'counter' else '')
+        yield f'# TYPE {nombre} {tipo}'
+        for etiqueta, cache in caches.items():
+            yield f'{nombre}{{{_etiquetas(cache=etiqueta)}}} {cache.estadisticas()[campo]}'
+
+def _lineas_tareas():
+    from tareas import cola_tareas
+    estadisticas = cola_tareas.estadisticas()
+    for clave in ('pendientes', 'en_curso'):
+        yield f'# TYPE complejo_tareas_{clave} gauge'
+        yield f'complejo_tareas_{clave} {estadisticas[clave]}'
+    yield '# TYPE complejo_tareas_total counter'
+    for resultado in ('completadas', 'reintentadas', 'fallidas'):
+        yield f'complejo_tareas_total{{{_etiquetas(resultado=resultado)}}} {estadisticas[resultado]}'
+    with cola_tareas._lock:
+        yield '# HELP complejo_tareas_espera_segundos Desde que se encola hasta que empieza'
+        yield '# TYPE complejo_tareas_espera_segundos histogram'
+        yield from _lineas_histograma('complejo_tareas_espera_segundos', cola_tareas.espera, cola='principal')
+        yield '# TYPE complejo_tareas_duracion_segundos histogram'
+        yield from _lineas_histograma('complejo_tareas_duracion_segundos', cola_tareas.duracion, cola='principal')
+
+def texto_prometheus(engine=None, metricas=metricas_peticiones):
+    """Todas las métricas en el formato de exposición de texto de Prometheus"""
+    lineas = list(_lineas_peticiones(metricas))
+    if engine is not None:
+        lineas.extend(_lineas_pool(engine))
+    lineas.extend(_lineas_caches())
+    lineas.extend(_lineas_tareas())
+    return '\n'.join(lineas) + '\n'
+
+def _antes_de_sentencia(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metricas_inicio', []).append(time.perf_counter())
+
+def _despues_de_sentencia(conn, cursor, statement, parameters, context, executemany):
+    duracion = time.perf_counter() - conn.info['metricas_inicio'].pop()
+    # Sólo se atribuyen a una petición las sentencias de su propio hilo;
+    # las respuestas en streaming y los procesos en segundo plano no cuentan
+    if not has_request_context():
+        return
+    medicion = g.get('metricas')
+    if medicion is None:
+        return
+    medicion['consultas'] += 1
+    medicion['tiempo_db'] += duracion
+    if SLOW_REQUEST_MS and len(medicion['sentencias']) < MAX_SENTENCIAS_LOG:
+        medicion['sentencias'].append((round(duracion * 1000, 2), statement))
+
+def _error_de_sentencia(contexto):
+    # Una sentencia fallida no llega a after_cursor_execute
+    conexion = contexto.connection
+    if conexion is not None and conexion.info.get('metricas_inicio'):
+        conexion.info['metricas_inicio'].pop()
+
+def _iniciar_medicion():
+    g.metricas = {'inicio': time.perf_counter(), 'consultas': 0, 'tiempo_db': 0.0, 'sentencias': []}
+
+def _registrar_estado(response):
+    medicion = g.get('metricas')
+    if medicion is not None:
+        medicion['estado'] = response.status_code
+    return response
+
+def _cerrar_medicion(error=None):
+    medicion = g.pop('metricas', None)
+    if medicion is None:
+        return
+    duracion = time.perf_counter() - medicion['inicio']
+    # La regla de la ruta y no la URL, para no crear una serie por cada id
+    endpoint = request.url_rule.rule if request.url_rule else 'sin_ruta'
+    estado = medicion.get('estado', 500 if error is not None else 200)
+    metricas_peticiones.registrar(
+        endpoint, request.method, estado, duracion, medicion['consultas'], medicion['tiempo_db']
+    )
+
+    if SLOW_REQUEST_MS and duracion * 1000 >= SLOW_REQUEST_MS:
+        sentencias = '\n'.join(f"  [{ms} ms] {sql}" for ms, sql in medicion['sentencias'])
+        log_lentas.warning(
+            "%s %s %s: %.1f ms, %d consultas, %.1f ms en la base\n%s",
+            request.method, request.full_path.rstrip('?'), estado, duracion * 1000,
+            medicion['consultas'], medicion['tiempo_db'] * 1000, sentencias
+        )
+
+def instalar(app, engine, replica=None):
+    """Conecta la medición a 'app' y 'engine' y publica GET /metrics; con
+    'replica', también cuenta las lecturas que van a la réplica"""
+    for motor in (engine, replica):
+        if motor is None:
+            continue
+        event.listen(motor, 'before_cursor_execute', _antes_de_sentencia)
+        event.listen(motor, 'after_cursor_execute', _despues_de_sentencia)
+        event.listen(motor, 'handle_error', _error_de_sentencia)
+    app.before_request(_iniciar_medicion)
+    app.after_request(_registrar_estado)
+    app.teardown_request(_cerrar_medicion)
+
+    def metricas():
+        return Response(texto_prometheus(engine), mimetype='text/plain; version=0.0.4; charset=utf-8')
+    app.add_url_rule('/metrics', 'metricas', metricas)
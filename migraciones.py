@@ -0,0 +1,208 @@
+import argparse
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, exists, func, inspect, select, text, update
+from database import (engine, Reserva, ReservaArchivo, ResumenDiario, Tarea, ESTADOS_ACTIVOS, indice_horario_activo,
+                      indice_pendientes_creacion, indice_tareas_pendientes, indices_reservas)
+from horarios import normalizar
+
+# Registro de migraciones aplicadas, separado de los modelos de la app
+metadata_migraciones = MetaData()
+esquema_version = Table(
+    "esquema_version", metadata_migraciones,
+    Column("version", Integer, primary_key=True),
+    Column("descripcion", String(200), nullable=False),
+    Column("fecha_aplicada", DateTime, nullable=False)
+)
+
+# Nota que reciben las reservas duplicadas que cancela la migración 2
+NOTA_DUPLICADA = 'Cancelada: horario duplicado al crear el índice único'
+
+def _claves_foraneas(conexion):
+    """Agrega las claves foráneas de reservas en bases creadas sin ellas.
+
+    Cada una se agrega NOT VALID y se confirma enseguida: ese ALTER sólo
+    toma un bloqueo breve. VALIDATE CONSTRAINT revisa después las filas
+    existentes en otra transacción, con un bloqueo que no impide leer ni
+    escribir. Una restricción que quedó sin validar se valida al repetir.
+    """
+    if conexion.dialect.name == 'sqlite':
+        # SQLite no permite agregar restricciones a una tabla existente
+        return
+
+    existentes = {
+        tuple(fk['constrained_columns']) for fk in inspect(conexion).get_foreign_keys('reservas')
+    }
+    for columna, tabla in [('cliente_id', 'clientes'), ('cancha_id', 'canchas')]:
+        if (columna,) in existentes:
+            continue
+        nombre = f"reservas_{columna}_fkey"
+        conexion.execute(text(
+            f"ALTER TABLE reservas ADD CONSTRAINT {nombre} "
+            f"FOREIGN KEY ({columna}) REFERENCES {tabla} (id) NOT VALID"
+        ))
+        conexion.commit()
+
+    sin_validar = conexion.scalars(text(
+        "SELECT conname FROM pg_constraint "
+        "WHERE conrelid = 'reservas'::regclass AND contype = 'f' AND NOT convalidated"
+    )).all()
+    for nombre in sin_validar:
+        conexion.execute(text(f'ALTER TABLE reservas VALIDATE CONSTRAINT "{nombre}"'))
+        conexion.commit()
+
+def _cancelar_duplicadas(conexion, variantes=None):
+    """Cancela las reservas activas que repiten cancha, día y horario de otra
+    activa con id menor; devuelve cuántas canceló. Con 'variantes' (textos de
+    un mismo turno), dos reservas con cualquiera de ellos cuentan como iguales."""
+    otra = Reserva.__table__.alias('otra')
+    if variantes is None:
+        mismo_horario = [otra.c.horario == Reserva.horario]
+    else:
+        mismo_horario = [Reserva.horario.in_(variantes), otra.c.horario.in_(variantes)]
+    duplicada = exists().where(
+        otra.c.cancha_id == Reserva.cancha_id,
+        otra.c.fecha_reserva == Reserva.fecha_reserva,
+        *mismo_horario,
+        otra.c.estado.in_(ESTADOS_ACTIVOS),
+        otra.c.id < Reserva.id
+    )
+    return conexion.execute(
+        update(Reserva)
+        .where(Reserva.estado.in_(ESTADOS_ACTIVOS), duplicada)
+        .values(estado='cancelada', notas=func.coalesce(Reserva.notas + '\n', '') + NOTA_DUPLICADA)
+    ).rowcount
+
+def _normalizar_horarios(conexion):
+    """Reescribe los horarios guardados con otra escritura ("17:00-18:00",
+    "17") con su texto canónico; devuelve cuántas reservas activas canceló.
+
+    El índice único compara el texto: sin esto, una reserva activa con la
+    escritura vieja no impediría otra del mismo turno con la canónica. Antes
+    de reescribir se cancelan las que chocarían, conservando la más antigua.
+    """
+    variantes = {}
+    for modelo in (Reserva, ReservaArchivo):
+        for horario in conexion.scalars(select(modelo.horario).distinct()):
+            if normalizar(horario) != horario:
+                variantes.setdefault(normalizar(horario), set()).add(horario)
+
+    canceladas = 0
+    for canonico, viejos in variantes.items():
+        canceladas += _cancelar_duplicadas(conexion, [canonico, *viejos])
+        for modelo in (Reserva, ReservaArchivo):
+            conexion.execute(update(modelo).where(modelo.horario.in_(viejos)).values(horario=canonico))
+    return canceladas
+
+def _informar_canceladas(conexion, canceladas):
+    if not canceladas:
+        return
+    print(f"⚠️  {canceladas} reservas duplicadas canceladas (notas: '{NOTA_DUPLICADA}')")
+    if inspect(conexion).has_table(ResumenDiario.__tablename__):
+        from resumen import reconstruir_resumen
+        reconstruir_resumen(conexion)
+
+def _crear_indice(conexion, indice):
+    """Crea 'indice' si falta. En PostgreSQL con CREATE INDEX CONCURRENTLY,
+    que no bloquea las escrituras mientras recorre la tabla; como no puede
+    correr dentro de una transacción, se confirma lo hecho hasta aquí y se
+    crea desde una conexión AUTOCOMMIT aparte."""
+    if conexion.dialect.name != 'postgresql':
+        indice.create(conexion, checkfirst=True)
+        return
+
+    conexion.commit()
+    with conexion.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as autocommit:
+        valido = autocommit.scalar(text(
+            "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :nombre"
+        ), {'nombre': indice.name})
+        if valido:
+            return
+        if valido is False:
+            # Un CONCURRENTLY que falló deja el índice inválido: se vuelve a crear
+            autocommit.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{indice.name}"'))
+        # Sólo para esta sentencia: create_all no puede usar CONCURRENTLY
+        opciones = indice.dialect_options['postgresql']
+        opciones['concurrently'] = True
+        try:
+            indice.create(autocommit)
+        finally:
+            opciones['concurrently'] = False
+
+def _indice_horario_activo(conexion):
+    # El índice único no se puede crear mientras haya duplicados, tampoco
+    # escritos distinto; se conserva la reserva más antigua de cada horario
+    canceladas = _normalizar_horarios(conexion) + _cancelar_duplicadas(conexion)
+    _informar_canceladas(conexion, canceladas)
+    _crear_indice(conexion, indice_horario_activo)
+
+def _horarios_canonicos(conexion):
+    # Bases que ya tenían el índice único (migración 2) antes de normalizar
+    _informar_canceladas(conexion, _normalizar_horarios(conexion))
+
+def _indices_reservas(conexion):
+    for indice in indices_reservas:
+        _crear_indice(conexion, indice)
+
+def _resumen_diario(conexion):
+    from resumen import reconstruir_resumen
+    ResumenDiario.__table__.create(conexion, checkfirst=True)
+    reconstruir_resumen(conexion)
+
+def _tabla_tareas(conexion):
+    Tarea.__table__.create(conexion, checkfirst=True)
+    _crear_indice(conexion, indice_tareas_pendientes)
+
+def _indice_pendientes(conexion):
+    _crear_indice(conexion, indice_pendientes_creacion)
+
+# (version, descripción, función) en orden de aplicación; nunca reordenar
+MIGRACIONES = [
+    (1, "Claves foráneas de reservas a clientes y canchas", _claves_foraneas),
+    (2, "Índice único parcial de horarios activos", _indice_horario_activo),
+    (3, "Índices compuestos y parciales de reservas", _indices_reservas),
+    (4, "Tabla resumen_diario calculada desde reservas", _resumen_diario),
+    (5, "Tabla tareas de la cola persistente", _tabla_tareas),
+    (6, "Índice parcial de reservas pendientes por creación", _indice_pendientes),
+    (7, "Horarios de reservas con su texto canónico", _horarios_canonicos),
+]
+
+def versiones_aplicadas(engine=engine):
+    metadata_migraciones.create_all(engine)
+    with engine.connect() as conexion:
+        return set(conexion.scalars(select(esquema_version.c.version)))
+
+def migrar(engine=engine):
+    """Aplica, cada una en su transacción, las migraciones pendientes.
+
+    Una migración puede confirmar pasos intermedios con conexion.commit();
+    entonces debe poder repetirse si falla después, porque sólo queda
+    registrada al terminar.
+    """
+    aplicadas = versiones_aplicadas(engine)
+
+    for version, descripcion, funcion in MIGRACIONES:
+        if version in aplicadas:
+            continue
+        with engine.connect() as conexion:
+            funcion(conexion)
+            conexion.execute(esquema_version.insert().values(
+                version=version,
+                descripcion=descripcion,
+                fecha_aplicada=datetime.now()
+            ))
+            conexion.commit()
+        print(f"✅ Migración {version} aplicada: {descripcion}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migraciones del esquema")
+    parser.add_argument('--estado', action='store_true', help="sólo listar migraciones")
+    args = parser.parse_args()
+
+    if args.estado:
+        aplicadas = versiones_aplicadas()
+        for version, descripcion, _ in MIGRACIONES:
+            marca = "✅" if version in aplicadas else "⏳"
+            print(f"{marca} {version}: {descripcion}")
+    else:
+        migrar()
@@ -0,0 +1,130 @@
+"""Mensajes a clientes y al administrador, enviados como tareas en segundo plano.
+
+Las escrituras encolan con encolar_*() dentro de su transacción; el envío
+ocurre en un trabajador de tareas.py, fuera de la petición, y se reintenta
+si el proveedor falla.
+
+NOTIFICADOR elige a dónde van los mensajes: 'registro' (por defecto) los
+escribe en el logger 'complejo.notificaciones', 'falso' los guarda en
+memoria para las pruebas (ver NotificadorFalso).
+"""
+import logging
+import os
+import threading
+from sqlalchemy.orm import joinedload
+from database import Session, Reserva
+from catalogo import catalogo_canchas
+from tareas import encolar_tras_commit, tarea
+
+NOTIFICADOR = os.environ.get('NOTIFICADOR', 'registro')
+
+# Destino de las alertas para el administrador
+ADMIN_TELEFONO = os.environ.get('ADMIN_TELEFONO', '')
+
+MENSAJES_ESTADO = {
+    'confirmada': "✅ Tu reserva #{id} para el {fecha} de {horario} en {cancha} está confirmada. ¡Te esperamos!",
+    'cancelada': "❌ Tu reserva #{id} para el {fecha} de {horario} en {cancha} fue cancelada.",
+    'completada': "⚽ ¡Gracias por jugar en el Complejo Toledo! Reserva #{id} completada.",
+}
+
+class NotificadorRegistro:
+    """Escribe cada mensaje en el log, sin enviarlo"""
+
+    def __init__(self):
+        self.log = logging.getLogger('complejo.notificaciones')
+
+    def enviar(self, destino, mensaje):
+        self.log.info("→ %s: %s", destino, mensaje)
+
+class NotificadorFalso:
+    """Guarda los mensajes en 'enviados'; con fallos=n, los n primeros envíos
+    lanzan ConnectionError para probar los reintentos"""
+
+    def __init__(self, fallos=0):
+        self.enviados = []
+        self.fallos = fallos
+        self._lock = threading.Lock()
+
+    def enviar(self, destino, mensaje):
+        with self._lock:
+            if self.fallos > 0:
+                self.fallos -= 1
+                raise ConnectionError("Fallo simulado del proveedor")
+            self.enviados.append((destino, mensaje))
+
+NOTIFICADORES = {'registro': NotificadorRegistro, 'falso': NotificadorFalso}
+
+notificador = NOTIFICADORES[NOTIFICADOR]()
+
+def usar_notificador(nuevo):
+    """Reemplaza el notificador en uso; devuelve el anterior"""
+    global notificador
+    anterior, notificador = notificador, nuevo
+    return anterior
+
+def _reservas(reserva_ids):
+    session_db = Session()
+    try:
+        return session_db.query(Reserva).options(joinedload(Reserva.cliente)).filter(
+            Reserva.id.in_(reserva_ids)
+        ).order_by(Reserva.fecha_reserva, Reserva.horario).all()
+    finally:
+        session_db.close()
+
+def _datos_mensaje(reserva):
+    cancha = catalogo_canchas.obtener(reserva.cancha_id)
+    return {
+        'id': reserva.id,
+        'fecha': reserva.fecha_reserva.strftime('%d/%m/%Y'),
+        'horario': reserva.horario,
+        'cancha': cancha.nombre if cancha else f"cancha {reserva.cancha_id}",
+        'monto': f"{reserva.monto_total or 0:,}".replace(',', '.')
+    }
+
+@tarea('confirmacion_reserva')
+def confirmacion_reserva(reserva_ids):
+    reservas = _reservas(reserva_ids)
+    if not reservas:
+        return
+    lineas = [
+        "📅 {fecha} {horario} - {cancha} (#{id}, Gs. {monto})".format(**_datos_mensaje(reserva))
+        for reserva in reservas
+    ]
+    cliente = reservas[0].cliente
+    notificador.enviar(cliente.telefono, "\n".join([
+        f"¡Hola {cliente.nombre}! Recibimos tu reserva en el Complejo Toledo:", *lineas,
+        "Te avisaremos cuando quede confirmada."
+    ]))
+
+@tarea('alerta_admin')
+def alerta_admin(reserva_ids):
+    if not ADMIN_TELEFONO:
+        return
+    reservas = _reservas(reserva_ids)
+    if not reservas:
+        return
+    cliente = reservas[0].cliente
+    turnos = ", ".join("{fecha} {horario} {cancha}".format(**_datos_mensaje(reserva)) for reserva in reservas)
+    notificador.enviar(ADMIN_TELEFONO,
+                       f"🔔 Nueva reserva de {cliente.nombre} {cliente.apellido} ({cliente.telefono}): {turnos}")
+
+@tarea('cambio_estado')
+def cambio_estado(reserva_id, estado):
+    plantilla = MENSAJES_ESTADO.get(estado)
+    reservas = _reservas([reserva_id])
+    # Si el estado volvió a cambiar antes del envío, el aviso ya no corresponde
+    if plantilla is None or not reservas or reservas[0].estado != estado:
+        return
+    notificador.enviar(reservas[0].cliente.telefono, plantilla.format(**_datos_mensaje(reservas[0])))
+
+def encolar_reservas_creadas(session_db, reserva_ids):
+    """Confirmación al cliente y alerta al administrador, tras el commit"""
+    if not reserva_ids:
+        return
+    encolar_tras_commit(session_db, 'confirmacion_reserva', reserva_ids=list(reserva_ids))
+    encolar_tras_commit(session_db, 'alerta_admin', reserva_ids=list(reserva_ids))
+
+def encolar_cambio_estado(session_db, reserva_id, estado):
+    """Aviso al cliente del nuevo estado de su reserva, tras el commit"""
+    if estado in MENSAJES_ESTADO:
+        encolar_tras_commit(session_db, 'cambio_estado', reserva_id=reserva_id, estado=estado)
@@ -0,0 +1,9 @@
+#!/bin/bash
+# Usuario de replicación para la réplica de docker-compose.yml
+set -e
+
+psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-SQL
+    CREATE ROLE replicador WITH REPLICATION LOGIN PASSWORD 'replicador';
+SQL
+
+echo "host replication replicador all scram-sha-256" >> "$PGDATA/pg_hba.conf"
@@ -0,0 +1,119 @@
+import csv
+import io
+from sqlalchemy import Date, cast, func
+from database import sesion_lectura, Reserva, Cancha, ResumenDiario, ESTADOS_CON_INGRESO
+
+AGRUPACIONES = ('dia', 'semana', 'mes')
+
+COLUMNAS_REPORTE = [
+    'periodo', 'cancha_id', 'cancha', 'horario', 'estado', 'metodo_pago',
+    'reservas', 'monto_total', 'ingresos'
+]
+
+COLUMNAS_RESUMEN = [
+    'periodo', 'cancha_id', 'cancha', 'reservas', 'pendientes', 'confirmadas',
+    'completadas', 'canceladas', 'ingresos', 'horarios_ocupados'
+]
+
+# Filas leídas por viaje al servidor al exportar CSV
+TAMANO_LOTE = 1000
+
+def expresion_periodo(columna, agrupar, dialecto):
+    """Inicio del día, semana (lunes) o mes de 'columna', como fecha"""
+    if dialecto == 'postgresql':
+        unidad = {'dia': 'day', 'semana': 'week', 'mes': 'month'}[agrupar]
+        return cast(func.date_trunc(unidad, columna), Date)
+    # SQLite no tiene date_trunc
+    modificadores = {'dia': (), 'semana': ('weekday 0', '-6 days'), 'mes': ('start of month',)}[agrupar]
+    return func.date(columna, *modificadores, type_=Date)
+
+def expresion_ingresos(columna_monto):
+    """Suma de montos de las reservas que cuentan como ingreso"""
+    return func.coalesce(func.sum(columna_monto).filter(Reserva.estado.in_(ESTADOS_CON_INGRESO)), 0)
+
+def consulta_reporte(session_db, desde, hasta, agrupar='dia'):
+    """Reservas, montos e ingresos agrupados por período, cancha, horario,
+    estado y método de pago, entre 'desde' y 'hasta' (exclusivo)"""
+    periodo = expresion_periodo(Reserva.fecha_reserva, agrupar, session_db.get_bind().dialect.name)
+
+    return session_db.query(
+        periodo.label('periodo'),
+        Cancha.id.label('cancha_id'),
+        Cancha.nombre.label('cancha'),
+        Reserva.horario,
+        Reserva.estado,
+        Reserva.metodo_pago,
+        func.count(Reserva.id).label('reservas'),
+        func.coalesce(func.sum(Reserva.monto_total), 0).label('monto_total'),
+        expresion_ingresos(Reserva.monto_total).label('ingresos')
+    ).join(Reserva.cancha).filter(
+        Reserva.fecha_reserva >= desde,
+        Reserva.fecha_reserva < hasta
+    ).group_by(
+        periodo, Cancha.id, Cancha.nombre, Reserva.horario, Reserva.estado, Reserva.metodo_pago
+    ).order_by(periodo, Cancha.id, Reserva.horario, Reserva.estado, Reserva.metodo_pago)
+
+def consulta_resumen(session_db, desde, hasta, agrupar='dia'):
+    """Totales por período y cancha leídos de resumen_diario: unas pocas
+    filas por día en lugar de todas las reservas del rango"""
+    periodo = expresion_periodo(ResumenDiario.fecha, agrupar, session_db.get_bind().dialect.name)
+    totales = [
+        func.sum(getattr(ResumenDiario, columna)).label(columna)
+        for columna in COLUMNAS_RESUMEN[3:]
+    ]
+
+    return session_db.query(
+        periodo.label('periodo'),
+        Cancha.id.label('cancha_id'),
+        Cancha.nombre.label('cancha'),
+        *totales
+    ).join(Cancha, Cancha.id == ResumenDiario.cancha_id).filter(
+        ResumenDiario.fecha >= desde,
+        ResumenDiario.fecha < hasta
+    ).group_by(periodo, Cancha.id, Cancha.nombre).order_by(periodo, Cancha.id)
+
+# Origen de datos de cada reporte: (consulta, columnas)
+FUENTES = {
+    'reservas': (consulta_reporte, COLUMNAS_REPORTE),
+    'resumen': (consulta_resumen, COLUMNAS_RESUMEN)
+}
+
+def _fila_a_dict(fila):
+    datos = dict(fila._mapping)
+    datos['periodo'] = datos['periodo'].isoformat()
+    return datos
+
+def reporte(session_db, desde, hasta, agrupar='dia', fuente='reservas'):
+    """Reporte agregado en forma de diccionario, con totales generales"""
+    consulta, _ = FUENTES[fuente]
+    filas = [_fila_a_dict(fila) for fila in consulta(session_db, desde, hasta, agrupar)]
+    return {
+        'agrupar': agrupar,
+        'fuente': fuente,
+        'total_reservas': sum(f['reservas'] for f in filas),
+        'ingresos_totales': sum(f['ingresos'] for f in filas),
+        'filas': filas
+    }
+
+def lineas_csv(desde, hasta, agrupar='dia', fuente='reservas', tamano_lote=TAMANO_LOTE):
+    """Genera el reporte como CSV, un bloque de texto por lote de filas.
+
+    Abre su propia sesión para poder consumirse como respuesta en streaming.
+    """
+    consulta, columnas = FUENTES[fuente]
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas)
+
+    session_db = sesion_lectura()
+    try:
+        for i, fila in enumerate(consulta(session_db, desde, hasta, agrupar).yield_per(tamano_lote), start=1):
+            datos = _fila_a_dict(fila)
+            escritor.writerow([datos[columna] for columna in columnas])
+            if i % tamano_lote == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    finally:
+        session_db.close()
+    yield buffer.getvalue()
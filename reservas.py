@@ -0,0 +1,109 @@
+"""Validación y respuesta de /reservar, comunes a la app WSGI (app.py) y ASGI (app_async.py)"""
+from datetime import datetime, date, timedelta
+from sqlalchemy import func
+from database import Cliente, insert_con_conflicto
+from horarios import indice, normalizar
+
+CAMPOS_REQUERIDOS = ['nombre', 'apellido', 'cedula', 'telefono', 'cancha_id', 'horario', 'metodo_pago']
+
+# En /reservar/lote los horarios van en 'horarios' (o 'horario')
+CAMPOS_REQUERIDOS_LOTE = [campo for campo in CAMPOS_REQUERIDOS if campo != 'horario']
+
+# Turnos (fecha × horario) por pedido de /reservar/lote
+MAX_TURNOS_LOTE = 200
+
+def validar_reserva(datos, campos=CAMPOS_REQUERIDOS):
+    """Mensaje de error del primer campo requerido que falte, o None"""
+    for campo in campos:
+        if campo not in datos or not str(datos[campo]).strip():
+            return f'Campo requerido: {campo}'
+    return None
+
+def upsert_cliente(ejecutor, datos):
+    """INSERT ... ON CONFLICT (cedula) DO UPDATE ... RETURNING id para el
+    cliente del pedido: un solo viaje a la base, sin carrera entre dos
+    primeras reservas de la misma cédula. Actualiza teléfono y email (un
+    email vacío no borra el guardado). Ejecutar con execute().scalar_one()."""
+    tabla = Cliente.__table__
+    insercion = insert_con_conflicto(ejecutor, Cliente).values(
+        cedula=datos['cedula'],
+        nombre=datos['nombre'],
+        apellido=datos['apellido'],
+        telefono=datos['telefono'],
+        email=datos.get('email', '')
+    )
+    return insercion.on_conflict_do_update(
+        index_elements=[tabla.c.cedula],
+        set_={
+            'telefono': insercion.excluded.telefono,
+            'email': func.coalesce(func.nullif(insercion.excluded.email, ''), tabla.c.email)
+        }
+    ).returning(tabla.c.id)
+
+def leer_cancha_id(datos):
+    cancha_id = datos['cancha_id']
+    return int(cancha_id) if str(cancha_id).isdigit() else None
+
+def leer_fecha_reserva(datos):
+    return datetime.strptime(datos.get('fecha', date.today().isoformat()), '%Y-%m-%d').date()
+
+def _leer_fecha(valor):
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+def turnos_lote(datos):
+    """Turnos (fecha, horario) pedidos a /reservar/lote, sin repetidos.
+
+    Las fechas son 'fechas' (lista), o 'fecha' sola, o de 'fecha' a 'hasta'
+    (inclusive) cada 'cada_dias' días (7 por defecto: misma hora cada
+    semana). Cada fecha se reserva en todos los 'horarios' pedidos, por
+    ejemplo dos horas seguidas. Lanza ValueError con un mensaje para el
+    cliente si el pedido no es válido.
+    """
+    horarios = datos.get('horarios') or ([datos['horario']] if datos.get('horario') else [])
+    if not isinstance(horarios, list) or not horarios:
+        raise ValueError('Campo requerido: horarios')
+    desconocidos = [h for h in horarios if indice(h) is None]
+    if desconocidos:
+        raise ValueError(f'Horario inválido: {desconocidos[0]}')
+    horarios = [normalizar(h) for h in horarios]
+
+    try:
+        if datos.get('fechas'):
+            fechas = [_leer_fecha(f) for f in datos['fechas']]
+        else:
+            inicio = leer_fecha_reserva(datos)
+            fin = _leer_fecha(datos['hasta']) if datos.get('hasta') else inicio
+            paso = int(datos.get('cada_dias', 7))
+            if paso < 1:
+                raise ValueError('cada_dias debe ser mayor que 0')
+            fechas = []
+            while inicio <= fin and len(fechas) <= MAX_TURNOS_LOTE:
+                fechas.append(inicio)
+                inicio += timedelta(days=paso)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Fechas inválidas: {e}')
+
+    turnos = list(dict.fromkeys((fecha, horario) for fecha in fechas for horario in horarios))
+    if not turnos:
+        raise ValueError('No hay turnos para reservar')
+    if len(turnos) > MAX_TURNOS_LOTE:
+        raise ValueError(f'Máximo {MAX_TURNOS_LOTE} turnos por pedido')
+    return turnos
+
+def respuesta_reserva(reserva_id, datos, cancha, fecha_reserva, monto_total):
+    return {
+        'success': True,
+        'reserva_id': reserva_id,
+        'mensaje': f'✅ Reserva confirmada. ID: {reserva_id}',
+        'detalles': {
+            'cliente': f"{datos['nombre']} {datos['apellido']}",
+            'cancha': cancha.nombre,
+            'tipo': cancha.tipo,
+            # Como quedó guardado, no como llegó en el pedido
+            'horario': normalizar(datos['horario']),
+            'fecha': fecha_reserva.strftime('%d/%m/%Y'),
+            'metodo_pago': datos['metodo_pago'],
+            'monto': f'Gs{monto_total:,}',
+            'duracion':'una hora'
+        }
+    }
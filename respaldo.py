@@ -0,0 +1,60 @@
+import json
+import zlib
+from datetime import date, datetime
+from sqlalchemy import select
+from database import sesion_lectura, Reserva, Cliente, Cancha
+
+# Tablas exportables, en orden de dependencias
+TABLAS = {
+    'canchas': Cancha.__table__,
+    'clientes': Cliente.__table__,
+    'reservas': Reserva.__table__
+}
+
+# Filas leídas por viaje al servidor (cursor del lado del servidor)
+TAMANO_LOTE = 1000
+
+def _serializar(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f'Tipo no serializable: {type(valor).__name__}')
+
+def lineas_ndjson(tabla, tamano_lote=TAMANO_LOTE):
+    """Genera una línea JSON por fila de la tabla, leyendo en lotes.
+
+    Abre su propia sesión para poder consumirse después de terminada
+    la petición que lo creó (respuestas en streaming).
+    """
+    tabla = TABLAS[tabla]
+    session_db = sesion_lectura()
+    try:
+        consulta = select(tabla).order_by(*tabla.primary_key.columns)
+        resultado = session_db.execute(consulta.execution_options(yield_per=tamano_lote))
+        for fila in resultado:
+            yield json.dumps(dict(fila._mapping), default=_serializar, ensure_ascii=False) + '\n'
+    finally:
+        session_db.close()
+
+def comprimir_gzip(lineas, nivel=6):
+    """Comprime un flujo de texto en formato gzip sin acumularlo en memoria"""
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for linea in lineas:
+        datos = compresor.compress(linea.encode('utf-8'))
+        if datos:
+            yield datos
+    yield compresor.flush()
+
+def exportar_tabla(tabla, destino, tamano_lote=TAMANO_LOTE):
+    """Escribe la tabla como NDJSON comprimido en 'destino'; devuelve la cantidad de filas"""
+    filas = 0
+
+    def contar(lineas):
+        nonlocal filas
+        for linea in lineas:
+            filas += 1
+            yield linea
+
+    with open(destino, 'wb') as archivo:
+        for bloque in comprimir_gzip(contar(lineas_ndjson(tabla, tamano_lote))):
+            archivo.write(bloque)
+    return filas
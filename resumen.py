@@ -0,0 +1,123 @@
+import argparse
+from sqlalchemy import Date, Integer, cast, delete, func, literal, select, union_all
+from database import (Session, Reserva, ReservaArchivo, ResumenDiario, ESTADOS_ACTIVOS,
+                      ESTADOS_CON_INGRESO, insert_con_conflicto)
+
+# Columna del resumen que cuenta cada estado
+COLUMNAS_ESTADO = {
+    'pendiente': 'pendientes',
+    'confirmada': 'confirmadas',
+    'completada': 'completadas',
+    'cancelada': 'canceladas'
+}
+
+COLUMNAS_TOTALES = ['reservas', *COLUMNAS_ESTADO.values(), 'ingresos', 'horarios_ocupados']
+
+def _deltas(estado_anterior, estado_nuevo, monto):
+    for estado in (estado_anterior, estado_nuevo):
+        if estado is not None and estado not in COLUMNAS_ESTADO:
+            raise ValueError(f"Estado de reserva desconocido: {estado!r}")
+    deltas = dict.fromkeys(COLUMNAS_TOTALES, 0)
+    for estado, signo in ((estado_anterior, -1), (estado_nuevo, 1)):
+        if estado is None:
+            continue
+        deltas['reservas'] += signo
+        if estado in COLUMNAS_ESTADO:
+            deltas[COLUMNAS_ESTADO[estado]] += signo
+        if estado in ESTADOS_CON_INGRESO:
+            deltas['ingresos'] += signo * (monto or 0)
+        if estado in ESTADOS_ACTIVOS:
+            deltas['horarios_ocupados'] += signo
+    return {columna: valor for columna, valor in deltas.items() if valor}
+
+def aplicar_cambio(session_db, cancha_id, fecha, estado_anterior, estado_nuevo, monto):
+    """Ajusta el resumen del día por el alta (estado_anterior=None), el cambio
+    de estado o la baja (estado_nuevo=None) de una reserva.
+
+    Es un único upsert dentro de la transacción de la escritura, así el
+    resumen nunca queda desfasado de las reservas confirmadas.
+    """
+    aplicar_cambios(session_db, [(cancha_id, fecha, estado_anterior, estado_nuevo, monto)])
+
+def aplicar_cambios(session_db, cambios):
+    """Como aplicar_cambio() para varias reservas a la vez: 'cambios' son tuplas
+    (cancha_id, fecha, estado_anterior, estado_nuevo, monto, ...) y se aplican con
+    un solo upsert de una fila por día y cancha."""
+    por_dia = {}
+    for cancha_id, fecha, estado_anterior, estado_nuevo, monto, *_ in cambios:
+        clave = (fecha.date() if hasattr(fecha, 'date') else fecha, cancha_id)
+        acumulado = por_dia.setdefault(clave, dict.fromkeys(COLUMNAS_TOTALES, 0))
+        for columna, valor in _deltas(estado_anterior, estado_nuevo, monto).items():
+            acumulado[columna] += valor
+
+    filas = [
+        {'fecha': fecha, 'cancha_id': cancha_id, **deltas}
+        for (fecha, cancha_id), deltas in por_dia.items()
+        if any(deltas.values())
+    ]
+    if not filas:
+        return
+
+    tabla = ResumenDiario.__table__
+    insercion = insert_con_conflicto(session_db, ResumenDiario).values(filas)
+    session_db.execute(insercion.on_conflict_do_update(
+        index_elements=[tabla.c.fecha, tabla.c.cancha_id],
+        set_={columna: tabla.c[columna] + insercion.excluded[columna] for columna in COLUMNAS_TOTALES}
+    ))
+
+def _consulta_totales():
+    """Totales por día y cancha calculados desde reservas y su archivo"""
+    origenes = union_all(*[
+        select(
+            modelo.cancha_id,
+            func.date(modelo.fecha_reserva, type_=Date).label('fecha'),
+            modelo.estado,
+            modelo.monto_total
+        )
+        for modelo in (Reserva, ReservaArchivo)
+    ]).subquery()
+
+    def contar(condicion):
+        return func.count().filter(condicion)
+
+    return select(
+        origenes.c.fecha,
+        origenes.c.cancha_id,
+        func.count(),
+        *[contar(origenes.c.estado == estado) for estado in COLUMNAS_ESTADO],
+        cast(func.coalesce(
+            func.sum(origenes.c.monto_total).filter(origenes.c.estado.in_(ESTADOS_CON_INGRESO)),
+            literal(0)
+        ), Integer),
+        contar(origenes.c.estado.in_(ESTADOS_ACTIVOS))
+    ).group_by(origenes.c.fecha, origenes.c.cancha_id)
+
+def reconstruir_resumen(ejecutor):
+    """Recalcula el resumen completo; devuelve la cantidad de filas generadas.
+
+    'ejecutor' puede ser una sesión o una conexión (migraciones).
+    """
+    ejecutor.execute(delete(ResumenDiario))
+    resultado = ejecutor.execute(
+        ResumenDiario.__table__.insert().from_select(['fecha', 'cancha_id', *COLUMNAS_TOTALES], _consulta_totales())
+    )
+    return resultado.rowcount
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resumen diario de reservas")
+    parser.add_argument('--reconstruir', action='store_true', help="recalcular desde cero")
+    args = parser.parse_args()
+
+    if args.reconstruir:
+        session_db = Session()
+        try:
+            filas = reconstruir_resumen(session_db)
+            session_db.commit()
+            print(f"✅ Resumen reconstruido: {filas} filas (día × cancha)")
+        except Exception:
+            session_db.rollback()
+            raise
+        finally:
+            session_db.close()
+    else:
+        parser.print_help()
@@ -0,0 +1,92 @@
+import argparse
+import os
+import time
+from datetime import date, timedelta
+from sqlalchemy import select, insert, delete
+from database import Session, Reserva, ReservaArchivo
+
+# Política de retención (configurable por entorno)
+RETENCION_DIAS = int(os.environ.get('RETENCION_DIAS', 30))
+RETENCION_LOTE = int(os.environ.get('RETENCION_LOTE', 1000))
+
+COLUMNAS = [c.name for c in Reserva.__table__.columns]
+
+def consulta_lote(fecha_limite, tamano_lote):
+    """SELECT de los ids del próximo lote a archivar, salteando las filas
+    que otra transacción tiene bloqueadas. El orden (fecha_reserva, id)
+    recorre ix_reservas_fecha_id desde el principio y se detiene a las
+    'tamano_lote' filas, sin leer la tabla entera en cada lote."""
+    return (
+        select(Reserva.id)
+        .where(Reserva.fecha_reserva < fecha_limite)
+        .order_by(Reserva.fecha_reserva, Reserva.id)
+        .limit(tamano_lote)
+        .with_for_update(skip_locked=True)
+    )
+
+def _mover_lote(session_db, fecha_limite, tamano_lote):
+    """Mueve un lote de reservas vencidas al archivo; devuelve cuántas movió"""
+    ids = session_db.scalars(consulta_lote(fecha_limite, tamano_lote)).all()
+    if not ids:
+        return 0
+
+    origen = select(*[Reserva.__table__.c[nombre] for nombre in COLUMNAS]).where(Reserva.id.in_(ids))
+    session_db.execute(insert(ReservaArchivo).from_select(COLUMNAS, origen))
+    session_db.execute(delete(Reserva).where(Reserva.id.in_(ids)))
+    return len(ids)
+
+def purgar_reservas_antiguas(dias=RETENCION_DIAS, tamano_lote=RETENCION_LOTE):
+    """Archiva y elimina las reservas anteriores a 'dias' atrás.
+
+    Cada lote es una transacción corta (INSERT ... SELECT + DELETE sobre
+    a lo sumo 'tamano_lote' filas), así los bloqueos no se acumulan.
+    Con dias < 1 se archivarían reservas de hoy o futuras: lanza ValueError.
+    """
+    if dias < 1 or tamano_lote < 1:
+        raise ValueError("dias y tamano_lote deben ser al menos 1")
+    fecha_limite = date.today() - timedelta(days=dias)
+    inicio_total = time.perf_counter()
+    lotes = []
+
+    while True:
+        inicio = time.perf_counter()
+        session_db = Session()
+        try:
+            movidas = _mover_lote(session_db, fecha_limite, tamano_lote)
+            session_db.commit()
+        except Exception:
+            session_db.rollback()
+            raise
+        finally:
+            session_db.close()
+
+        if not movidas:
+            break
+        lotes.append({
+            'lote': len(lotes) + 1,
+            'filas': movidas,
+            'segundos': round(time.perf_counter() - inicio, 4)
+        })
+        if movidas < tamano_lote:
+            break
+
+    return {
+        'fecha_limite': fecha_limite,
+        'archivadas': sum(lote['filas'] for lote in lotes),
+        'lotes': lotes,
+        'segundos': round(time.perf_counter() - inicio_total, 4)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archiva las reservas antiguas")
+    parser.add_argument('--dias', type=int, default=RETENCION_DIAS, help="días de retención")
+    parser.add_argument('--lote', type=int, default=RETENCION_LOTE, help="filas por transacción")
+    args = parser.parse_args()
+    if args.dias < 1 or args.lote < 1:
+        parser.error("--dias y --lote deben ser al menos 1")
+
+    resultado = purgar_reservas_antiguas(args.dias, args.lote)
+    for lote in resultado['lotes']:
+        print(f"  Lote {lote['lote']}: {lote['filas']} filas en {lote['segundos']}s")
+    print(f"✅ {resultado['archivadas']} reservas anteriores a "
+          f"{resultado['fecha_limite'].strftime('%d/%m/%Y')} archivadas en {resultado['segundos']}s")
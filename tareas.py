@@ -0,0 +1,319 @@
+"""Cola de tareas en segundo plano para los efectos secundarios de las escrituras.
+
+Las peticiones encolan con encolar_tras_commit(): la tarea sólo se entrega
+a los trabajadores si la transacción confirma, y la petición responde sin
+esperar a que se ejecute. Cada tarea es una función registrada con
+@tarea('nombre') que recibe los datos encolados como argumentos de nombre.
+
+Una tarea que lanza una excepción se reintenta hasta TAREAS_REINTENTOS
+veces, con espera exponencial (TAREAS_BACKOFF, 2x, 4x... hasta
+TAREAS_BACKOFF_MAX) más un poco de azar; después queda como fallida.
+
+Por defecto la cola vive en memoria y las tareas pendientes se pierden al
+reiniciar el proceso. Con TAREAS_PERSISTENTES=1 se guardan en la tabla
+tareas dentro de la misma transacción que las origina, y cualquier proceso
+con trabajadores las toma de ahí (FOR UPDATE SKIP LOCKED en PostgreSQL).
+"""
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, select, update
+from database import Session, Tarea, engine
+from metricas import Histograma
+
+# Hilos trabajadores por proceso (0 = este proceso sólo encola)
+TAREAS_HILOS = int(os.environ.get('TAREAS_HILOS', 2))
+
+# Ejecuciones de una tarea antes de darla por fallida
+TAREAS_REINTENTOS = int(os.environ.get('TAREAS_REINTENTOS', 5))
+
+# Espera (segundos) antes del primer reintento, y máximo entre reintentos
+TAREAS_BACKOFF = float(os.environ.get('TAREAS_BACKOFF', 2))
+TAREAS_BACKOFF_MAX = float(os.environ.get('TAREAS_BACKOFF_MAX', 300))
+
+# Guardar las tareas en la base en lugar de en memoria
+TAREAS_PERSISTENTES = os.environ.get('TAREAS_PERSISTENTES', '0') not in ('0', 'false', 'no')
+
+# Segundos entre consultas a la tabla tareas cuando no hay avisos locales
+TAREAS_SONDEO = float(os.environ.get('TAREAS_SONDEO', 1))
+
+# Una tarea en curso por más tiempo que esto se considera abandonada
+TAREAS_VENCIMIENTO = int(os.environ.get('TAREAS_VENCIMIENTO', 300))
+
+log = logging.getLogger('complejo.tareas')
+
+Trabajo = namedtuple('Trabajo', ['id', 'nombre', 'datos', 'intentos', 'creada'])
+
+_manejadores = {}
+
+def tarea(nombre):
+    """Registra la función decorada como manejador de las tareas 'nombre'"""
+    def registrar(funcion):
+        _manejadores[nombre] = funcion
+        return funcion
+    return registrar
+
+def espera_reintento(intentos, base=TAREAS_BACKOFF, maximo=TAREAS_BACKOFF_MAX):
+    """Segundos hasta el próximo intento tras 'intentos' ejecuciones fallidas"""
+    espera = min(maximo, base * 2 ** (intentos - 1))
+    return espera * random.uniform(1, 1.2)
+
+def consulta_reclamar(ahora):
+    """UPDATE ... RETURNING que marca en curso la próxima tarea pendiente
+    vencida; con SKIP LOCKED dos trabajadores nunca toman la misma"""
+    siguiente = (
+        select(Tarea.id)
+        .where(Tarea.estado == 'pendiente', Tarea.ejecutar_en <= ahora)
+        .order_by(Tarea.ejecutar_en)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    return (
+        update(Tarea)
+        .where(Tarea.id == siguiente, Tarea.estado == 'pendiente')
+        .values(estado='en_curso', intentos=Tarea.intentos + 1, tomada_en=ahora)
+        .returning(Tarea.id, Tarea.nombre, Tarea.datos, Tarea.intentos, Tarea.creada)
+    )
+
+class AlmacenMemoria:
+    """Tareas en un heap ordenado por momento de ejecución"""
+
+    def __init__(self):
+        self._heap = []
+        self._secuencia = itertools.count(1)
+        self._condicion = threading.Condition()
+
+    def agregar(self, nombre, datos, session_db):
+        # Llega con entregar() después del commit
+        pass
+
+    def entregar(self, tareas):
+        with self._condicion:
+            for nombre, datos, creada in tareas:
+                trabajo = Trabajo(next(self._secuencia), nombre, datos, 0, creada)
+                heapq.heappush(self._heap, (time.monotonic(), trabajo.id, trabajo))
+            self._condicion.notify(len(tareas))
+
+    def tomar(self, espera):
+        with self._condicion:
+            limite = time.monotonic() + espera
+            while True:
+                ahora = time.monotonic()
+                if self._heap and self._heap[0][0] <= ahora:
+                    trabajo = heapq.heappop(self._heap)[2]
+                    return trabajo._replace(intentos=trabajo.intentos + 1)
+                if ahora >= limite:
+                    return None
+                siguiente = self._heap[0][0] if self._heap else limite
+                self._condicion.wait(min(siguiente, limite) - ahora)
+
+    def completar(self, trabajo):
+        pass
+
+    def reintentar(self, trabajo, espera, error):
+        with self._condicion:
+            heapq.heappush(self._heap, (time.monotonic() + espera, trabajo.id, trabajo))
+            self._condicion.notify()
+
+    def fallar(self, trabajo, error):
+        pass
+
+    def despertar(self):
+        with self._condicion:
+            self._condicion.notify_all()
+
+    def pendientes(self):
+        return len(self._heap)
+
+class AlmacenBase:
+    """Tareas en la tabla tareas; sobreviven a reinicios y se reparten
+    entre todos los procesos con trabajadores"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._aviso = threading.Event()
+
+    def agregar(self, nombre, datos, session_db):
+        # En la transacción de la escritura que la origina
+        ahora = datetime.now()
+        session_db.add(Tarea(nombre=nombre, datos=json.dumps(datos), estado='pendiente',
+                             intentos=0, ejecutar_en=ahora, creada=ahora))
+
+    def entregar(self, tareas):
+        # Ya están en la tabla: sólo despertar a los trabajadores locales
+        self._aviso.set()
+
+    def tomar(self, espera):
+        trabajo = self._reclamar()
+        if trabajo is None:
+            self._aviso.wait(min(espera, TAREAS_SONDEO))
+            self._aviso.clear()
+        return trabajo
+
+    def _reclamar(self):
+        with self.engine.begin() as conexion:
+            fila = conexion.execute(consulta_reclamar(datetime.now())).first()
+        if fila is None:
+            return None
+        return Trabajo(fila.id, fila.nombre, json.loads(fila.datos), fila.intentos, fila.creada)
+
+    def _actualizar(self, trabajo, **valores):
+        with self.engine.begin() as conexion:
+            conexion.execute(update(Tarea).where(Tarea.id == trabajo.id).values(**valores))
+
+    def completar(self, trabajo):
+        self._actualizar(trabajo, estado='completada', error=None)
+
+    def reintentar(self, trabajo, espera, error):
+        self._actualizar(trabajo, estado='pendiente', error=error,
+                         ejecutar_en=datetime.now() + timedelta(seconds=espera))
+
+    def fallar(self, trabajo, error):
+        self._actualizar(trabajo, estado='fallida', error=error)
+
+    def despertar(self):
+        self._aviso.set()
+
+    def recuperar_abandonadas(self):
+        """Devuelve a pendiente las tareas de trabajadores que murieron a mitad"""
+        limite = datetime.now() - timedelta(seconds=TAREAS_VENCIMIENTO)
+        with self.engine.begin() as conexion:
+            return conexion.execute(
+                update(Tarea)
+                .where(Tarea.estado == 'en_curso', Tarea.tomada_en < limite)
+                .values(estado='pendiente')
+            ).rowcount
+
+    def pendientes(self):
+        with self.engine.connect() as conexion:
+            return conexion.scalar(select(func.count()).select_from(Tarea).where(Tarea.estado == 'pendiente'))
+
+class ColaTareas:
+    """Trabajadores, reintentos y métricas sobre un almacén de tareas"""
+
+    def __init__(self, almacen, hilos=TAREAS_HILOS, reintentos=TAREAS_REINTENTOS):
+        self.almacen = almacen
+        self.hilos = hilos
+        self.reintentos = reintentos
+        self._trabajadores = []
+        self._detener = threading.Event()
+        self._lock = threading.Lock()
+        self.en_curso = 0
+        self.completadas = 0
+        self.reintentadas = 0
+        self.fallidas = 0
+        # Desde que se encoló hasta que empieza, y lo que tarda en ejecutarse
+        self.espera = Histograma((0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300))
+        self.duracion = Histograma((0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+
+    def iniciar(self):
+        if self._trabajadores or self.hilos <= 0:
+            return
+        if isinstance(self.almacen, AlmacenBase):
+            recuperadas = self.almacen.recuperar_abandonadas()
+            if recuperadas:
+                log.warning("%d tareas abandonadas vuelven a la cola", recuperadas)
+        self._detener.clear()
+        for i in range(self.hilos):
+            hilo = threading.Thread(target=self._trabajar, name=f'tareas-{i}', daemon=True)
+            hilo.start()
+            self._trabajadores.append(hilo)
+
+    def detener(self, espera=5):
+        self._detener.set()
+        self.almacen.despertar()
+        for hilo in self._trabajadores:
+            hilo.join(espera)
+        self._trabajadores = []
+
+    def _trabajar(self):
+        while not self._detener.is_set():
+            try:
+                trabajo = self.almacen.tomar(1)
+            except Exception:
+                log.exception("No se pudo tomar la próxima tarea")
+                self._detener.wait(TAREAS_SONDEO)
+                continue
+            if trabajo is not None:
+                self.ejecutar(trabajo)
+
+    def ejecutar(self, trabajo):
+        inicio = time.perf_counter()
+        with self._lock:
+            self.en_curso += 1
+            self.espera.observar(max(0.0, (datetime.now() - trabajo.creada).total_seconds()))
+        try:
+            manejador = _manejadores.get(trabajo.nombre)
+            if manejador is None:
+                raise LookupError(f"Tarea desconocida: {trabajo.nombre}")
+            manejador(**trabajo.datos)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if trabajo.intentos < self.reintentos and not isinstance(e, LookupError):
+                espera = espera_reintento(trabajo.intentos)
+                log.warning("Tarea %s #%s falló (intento %d), reintento en %.1f s: %s",
+                            trabajo.nombre, trabajo.id, trabajo.intentos, espera, error)
+                self.almacen.reintentar(trabajo, espera, error)
+                resultado = 'reintentadas'
+            else:
+                log.error("Tarea %s #%s fallida tras %d intentos: %s",
+                          trabajo.nombre, trabajo.id, trabajo.intentos, error)
+                self.almacen.fallar(trabajo, error)
+                resultado = 'fallidas'
+        else:
+            self.almacen.completar(trabajo)
+            resultado = 'completadas'
+        with self._lock:
+            self.en_curso -= 1
+            setattr(self, resultado, getattr(self, resultado) + 1)
+            self.duracion.observar(time.perf_counter() - inicio)
+
+    def esperar_vacia(self, espera=10):
+        """Espera a que no queden tareas pendientes ni en curso (para pruebas)"""
+        limite = time.monotonic() + espera
+        while time.monotonic() < limite:
+            if self.en_curso == 0 and self.almacen.pendientes() == 0:
+                return True
+            time.sleep(0.01)
+        return False
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'almacen': 'base' if isinstance(self.almacen, AlmacenBase) else 'memoria',
+                'hilos': len(self._trabajadores),
+                'pendientes': self.almacen.pendientes(),
+                'en_curso': self.en_curso,
+                'completadas': self.completadas,
+                'reintentadas': self.reintentadas,
+                'fallidas': self.fallidas,
+                'espera_promedio_ms': round(1000 * self.espera.suma / self.espera.cantidad, 3) if self.espera.cantidad else 0,
+                'duracion_promedio_ms': round(1000 * self.duracion.suma / self.duracion.cantidad, 3) if self.duracion.cantidad else 0
+            }
+
+cola_tareas = ColaTareas(AlmacenBase(engine) if TAREAS_PERSISTENTES else AlmacenMemoria())
+
+def encolar_tras_commit(session_db, nombre, **datos):
+    """Encola la tarea 'nombre' si la transacción en curso confirma"""
+    if nombre not in _manejadores:
+        raise LookupError(f"Tarea desconocida: {nombre}")
+    cola_tareas.almacen.agregar(nombre, datos, session_db)
+    session_db.info.setdefault('tareas', []).append((nombre, datos, datetime.now()))
+
+@event.listens_for(Session, 'after_commit')
+def _despues_del_commit(session_db):
+    tareas = session_db.info.pop('tareas', None)
+    if tareas:
+        cola_tareas.almacen.entregar(tareas)
+
+@event.listens_for(Session, 'after_rollback')
+def _despues_del_rollback(session_db):
+    session_db.info.pop('tareas', None)
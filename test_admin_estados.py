@@ -0,0 +1,191 @@
+"""Cambios de estado del panel: transiciones permitidas y alcance de los filtros masivos"""
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import select
+
+HOY = date.today()
+MANANA = HOY + timedelta(days=1)
+
+def reservar(cliente, cancha_id=1, horario='17:00 - 18:00', fecha=HOY, metodo_pago='efectivo', cedula='100'):
+    respuesta = cliente.post('/reservar', json={
+        'nombre': 'Ana', 'apellido': 'Paz', 'cedula': cedula, 'telefono': '0981',
+        'cancha_id': cancha_id, 'horario': horario, 'fecha': fecha.isoformat(), 'metodo_pago': metodo_pago
+    })
+    assert respuesta.status_code == 200, respuesta.json
+    return respuesta.json['reserva_id']
+
+def estados(base):
+    from database import Reserva
+    with base.Session() as session_db:
+        return dict(session_db.execute(select(Reserva.id, Reserva.estado)).all())
+
+def resumen_coincide(base):
+    """El resumen mantenido en cada escritura es igual al reconstruido"""
+    from database import ResumenDiario
+    from resumen import reconstruir_resumen
+    consulta = select(ResumenDiario.__table__).order_by(ResumenDiario.fecha, ResumenDiario.cancha_id)
+    with base.engine.begin() as conexion:
+        mantenido = conexion.execute(consulta).all()
+        reconstruir_resumen(conexion)
+        reconstruido = conexion.execute(consulta).all()
+    return mantenido == reconstruido
+
+def cambiar(admin, reserva_id, nuevo_estado):
+    return admin.post('/admin/actualizar_estado', json={'reserva_id': reserva_id, 'nuevo_estado': nuevo_estado}).json
+
+def lote(admin, **datos):
+    return admin.post('/admin/actualizar_estado_lote', json=datos)
+
+# --- /admin/actualizar_estado ---
+
+@pytest.mark.parametrize('nuevo_estado', [None, 'confirmda', '', 'vencida'])
+def test_estado_desconocido_no_se_guarda(admin, base, nuevo_estado):
+    reserva_id = reservar(admin)
+    resultado = cambiar(admin, reserva_id, nuevo_estado)
+    assert resultado == {'success': False, 'error': 'Estado inválido'}
+    assert estados(base)[reserva_id] == 'pendiente'
+    assert resumen_coincide(base)
+
+def test_transiciones_permitidas(admin, base):
+    reserva_id = reservar(admin)
+    assert cambiar(admin, reserva_id, 'confirmada')['success']
+    assert cambiar(admin, reserva_id, 'completada')['success']
+    assert cambiar(admin, reserva_id, 'pendiente')['success']
+    assert cambiar(admin, reserva_id, 'cancelada')['success']
+    assert estados(base)[reserva_id] == 'cancelada'
+    assert resumen_coincide(base)
+
+@pytest.mark.parametrize('camino, prohibido', [
+    ([], 'completada'),
+    (['cancelada'], 'confirmada'),
+    (['confirmada', 'completada'], 'cancelada'),
+])
+def test_transicion_no_permitida(admin, base, camino, prohibido):
+    reserva_id = reservar(admin)
+    for estado in camino:
+        assert cambiar(admin, reserva_id, estado)['success']
+    resultado = cambiar(admin, reserva_id, prohibido)
+    assert not resultado['success']
+    assert estados(base)[reserva_id] == (camino[-1] if camino else 'pendiente')
+    assert resumen_coincide(base)
+
+@pytest.mark.parametrize('estado_nuevo', [None, 'vencida'])
+def test_resumen_rechaza_estado_desconocido(admin, base, estado_nuevo):
+    from cambios import registrar_cambio
+    from database import Reserva
+    reserva_id = reservar(admin)
+    with base.Session() as session_db:
+        reserva = session_db.get(Reserva, reserva_id)
+        with pytest.raises(ValueError):
+            registrar_cambio(session_db, reserva.cancha_id, reserva.fecha_reserva, 'pendiente',
+                             estado_nuevo, reserva.monto_total, reserva.horario, reserva.id)
+        session_db.commit()
+    assert resumen_coincide(base)
+
+def test_cambio_concurrente_no_duplica_el_resumen(admin, base, monkeypatch):
+    import admin as modulo_admin
+    from sqlalchemy import update
+    from database import Reserva
+    reserva_id = reservar(admin)
+    original = modulo_admin._consulta_cambio_estado
+
+    def con_carrera(condiciones, nuevo_estado):
+        # Otro administrador (o el vencimiento) la cancela entre la lectura y el UPDATE
+        with base.engine.begin() as conexion:
+            conexion.execute(update(Reserva).where(Reserva.id == reserva_id).values(estado='cancelada'))
+        return original(condiciones, nuevo_estado)
+
+    monkeypatch.setattr(modulo_admin, '_consulta_cambio_estado', con_carrera)
+    resultado = cambiar(admin, reserva_id, 'confirmada')
+    assert not resultado['success']
+    assert estados(base)[reserva_id] == 'cancelada'
+
+# --- /admin/actualizar_estado_lote con ids ---
+
+def test_lote_por_ids_informa_cada_id(admin, base):
+    pendiente = reservar(admin, horario='17:00 - 18:00')
+    completada = reservar(admin, horario='18:00 - 19:00')
+    cambiar(admin, completada, 'confirmada')
+    cambiar(admin, completada, 'completada')
+    ya_confirmada = reservar(admin, horario='19:00 - 20:00')
+    cambiar(admin, ya_confirmada, 'confirmada')
+
+    respuesta = lote(admin, nuevo_estado='confirmada', ids=[pendiente, completada, ya_confirmada, 999])
+    assert respuesta.status_code == 200
+    resultados = {r['id']: r['resultado'] for r in respuesta.json['resultados']}
+    assert resultados == {
+        pendiente: 'actualizada',
+        completada: 'transicion_invalida',
+        ya_confirmada: 'sin_cambios',
+        999: 'no_encontrada'
+    }
+    assert estados(base)[completada] == 'completada'
+    assert resumen_coincide(base)
+
+def test_lote_no_reactiva_horario_tomado(admin, base):
+    cancelada = reservar(admin, cedula='1')
+    cambiar(admin, cancelada, 'cancelada')
+    reservar(admin, cedula='2')
+
+    resultados = lote(admin, nuevo_estado='pendiente', ids=[cancelada]).json['resultados']
+    assert resultados == [{'id': cancelada, 'resultado': 'horario_ocupado'}]
+    assert estados(base)[cancelada] == 'cancelada'
+
+@pytest.mark.parametrize('datos', [
+    {'nuevo_estado': 'confirmda', 'ids': [1]},
+    {'nuevo_estado': None, 'ids': [1]},
+    {'nuevo_estado': 'confirmada', 'ids': ['x']},
+    {'nuevo_estado': 'confirmada', 'ids': []},
+    {'nuevo_estado': 'confirmada'},
+])
+def test_lote_pedido_invalido(admin, base, datos):
+    reserva_id = reservar(admin)
+    assert lote(admin, **datos).status_code == 400
+    assert estados(base)[reserva_id] == 'pendiente'
+
+# --- /admin/actualizar_estado_lote con filtro ---
+
+def test_filtro_solo_toca_lo_filtrado(admin, base):
+    objetivo = reservar(admin, fecha=HOY, metodo_pago='transferencia')
+    otra_fecha = reservar(admin, fecha=MANANA, metodo_pago='transferencia')
+    otro_pago = reservar(admin, fecha=HOY, horario='20:00 - 21:00', metodo_pago='efectivo')
+    otra_cancha = reservar(admin, cancha_id=2, fecha=HOY, metodo_pago='transferencia')
+
+    respuesta = lote(admin, nuevo_estado='confirmada', filtro={
+        'estado': 'pendiente', 'fecha': HOY.isoformat(), 'metodo_pago': 'transferencia', 'cancha_id': '1'
+    })
+    assert respuesta.status_code == 200
+    assert respuesta.json['actualizadas'] == 1
+    assert estados(base) == {
+        objetivo: 'confirmada', otra_fecha: 'pendiente', otro_pago: 'pendiente', otra_cancha: 'pendiente'
+    }
+    assert resumen_coincide(base)
+
+def test_filtro_por_rango(admin, base):
+    hoy = reservar(admin, fecha=HOY)
+    manana = reservar(admin, fecha=MANANA)
+    pasado = reservar(admin, fecha=MANANA + timedelta(days=1))
+
+    respuesta = lote(admin, nuevo_estado='cancelada', filtro={'desde': HOY.isoformat(), 'hasta': MANANA.isoformat()})
+    assert respuesta.json['actualizadas'] == 2
+    assert estados(base) == {hoy: 'cancelada', manana: 'cancelada', pasado: 'pendiente'}
+
+@pytest.mark.parametrize('filtro', [
+    {'estado': 'pendiente', 'fecha': '20-10-2030'},
+    {'estado': 'pendiente', 'desde': 'mañana'},
+    {'estado': 'pendiente', 'hasta': '2030-02-30'},
+    {'estado': 'pendiente', 'cancha_id': 'uno'},
+    {'estado': 'pendiente', 'dia': HOY.isoformat()},
+    {'estado': 'pendiente', 'fecha': ''},
+    {'estado': 'pendiente', 'metodo_pago': None},
+    {'estado': 'pendientes'},
+    {'estado': 'pendiente', 'fecha': HOY.isoformat(), 'desde': HOY.isoformat()},
+    {},
+])
+def test_filtro_invalido_no_modifica_nada(admin, base, filtro):
+    reservas = [reservar(admin, fecha=HOY), reservar(admin, fecha=MANANA)]
+    respuesta = lote(admin, nuevo_estado='confirmada', filtro=filtro)
+    assert respuesta.status_code == 400
+    assert not respuesta.json['success']
+    assert set(estados(base).values()) == {'pendiente'}
+    assert sorted(estados(base)) == sorted(reservas)
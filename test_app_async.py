@@ -0,0 +1,38 @@
+"""App ASGI: el catálogo de canchas se recarga sin bloquear el event loop"""
+import asyncio
+import threading
+import pytest
+
+@pytest.fixture
+def app_async(base, monkeypatch):
+    import app_async
+    from catalogo import CatalogoCanchas
+    # Catálogo sin cargar, como al arrancar o al vencer CATALOGO_TTL
+    monkeypatch.setattr(app_async, 'catalogo_canchas', CatalogoCanchas())
+    yield app_async
+    asyncio.run(app_async.engine_async.dispose())
+
+def _en_hilo(corrutina, espera=20):
+    """Corre 'corrutina' en su propio event loop; si el loop queda bloqueado,
+    el hilo sigue vivo al vencer 'espera' en lugar de colgar la prueba"""
+    resultado = {}
+    hilo = threading.Thread(target=lambda: resultado.update(valor=asyncio.run(corrutina)), daemon=True)
+    hilo.start()
+    hilo.join(espera)
+    assert not hilo.is_alive(), "el event loop quedó bloqueado"
+    return resultado['valor']
+
+def test_peticiones_concurrentes_con_catalogo_vencido(app_async):
+    cliente = app_async.app.test_client()
+
+    async def pedir_varias():
+        respuestas = await asyncio.gather(*[
+            cliente.get(ruta)
+            for ruta in ['/disponibilidad/libres', '/disponibilidad/matriz?dias=2'] * 4
+        ])
+        return [(r.status_code, await r.get_json()) for r in respuestas]
+
+    respuestas = _en_hilo(pedir_varias())
+    assert [status for status, _ in respuestas] == [200] * 8
+    activas = {cancha.id for cancha in app_async.catalogo_canchas.activas()}
+    assert {cancha['id'] for cancha in respuestas[0][1]['canchas']} == activas
@@ -0,0 +1,38 @@
+"""Caché de disponibilidad: vencimiento por TTL e invalidación por avisos de otros procesos"""
+import json
+from datetime import date
+from cache import CacheLRU, cache_disponibilidad
+
+HOY = date(2030, 1, 15)
+
+def test_ttl_vence_entradas(monkeypatch):
+    import cache
+    ahora = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: ahora[0])
+    lru = CacheLRU(capacidad=4, ttl=30)
+    lru.guardar('a', 1)
+    ahora[0] += 29
+    assert lru.obtener('a') == 1
+    ahora[0] += 2
+    assert lru.obtener('a') is None
+
+def test_disponibilidad_tiene_ttl():
+    assert cache_disponibilidad.ttl
+
+def test_aviso_de_otro_proceso_invalida_el_dia(base):
+    from versiones import _aplicar_aviso
+    cache_disponibilidad.guardar((1, HOY), 0b1)
+    cache_disponibilidad.guardar((2, HOY), 0b10)
+    _aplicar_aviso(json.dumps({'d': [[1, HOY.isoformat()]], 'r': []}))
+    assert cache_disponibilidad.obtener((1, HOY)) is None
+    assert cache_disponibilidad.obtener((2, HOY)) == 0b10
+
+def test_aviso_sin_detalle_limpia_todo(base):
+    from versiones import _aplicar_aviso, versiones
+    arranque = versiones.arranque
+    cache_disponibilidad.guardar((1, HOY), 0b1)
+    cache_disponibilidad.guardar((2, HOY), 0b10)
+    _aplicar_aviso('*')
+    assert cache_disponibilidad.obtener((1, HOY)) is None
+    assert cache_disponibilidad.obtener((2, HOY)) is None
+    assert versiones.arranque != arranque
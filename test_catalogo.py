@@ -0,0 +1,68 @@
+"""Catálogo de canchas: una recarga lenta no frena a los demás hilos"""
+import threading
+from catalogo import CanchaInfo, CatalogoCanchas
+
+CANCHA = CanchaInfo(1, 'Cancha 1', 'Fútbol 5', 70000, True)
+
+def test_recarga_lenta_no_bloquea_lecturas():
+    catalogo = CatalogoCanchas(ttl=300)
+    lecturas = []
+    liberar = threading.Event()
+    leyendo = threading.Event()
+
+    def leer(session_db):
+        lecturas.append(1)
+        if len(lecturas) > 1:
+            leyendo.set()
+            assert liberar.wait(5)
+        return (CANCHA,)
+
+    catalogo._leer = leer
+    assert catalogo.todas() == (CANCHA,)
+    catalogo.invalidar()
+
+    recarga = threading.Thread(target=catalogo.todas)
+    recarga.start()
+    assert leyendo.wait(5)
+    # Mientras la recarga espera a la base, los demás leen la copia anterior
+    otros = [threading.Thread(target=catalogo.todas) for _ in range(4)]
+    for hilo in otros:
+        hilo.start()
+    for hilo in otros:
+        hilo.join(1)
+        assert not hilo.is_alive()
+    liberar.set()
+    recarga.join(5)
+    assert len(lecturas) == 2
+
+def test_primera_carga_una_sola_consulta():
+    catalogo = CatalogoCanchas(ttl=300)
+    lecturas = []
+    liberar = threading.Event()
+
+    def leer(session_db):
+        lecturas.append(1)
+        assert liberar.wait(5)
+        return (CANCHA,)
+
+    catalogo._leer = leer
+    resultados = []
+    hilos = [threading.Thread(target=lambda: resultados.append(catalogo.todas())) for _ in range(5)]
+    for hilo in hilos:
+        hilo.start()
+    liberar.set()
+    for hilo in hilos:
+        hilo.join(5)
+    assert resultados == [(CANCHA,)] * 5
+    assert len(lecturas) == 1
+
+def test_invalidar_durante_la_carga_deja_vencido():
+    catalogo = CatalogoCanchas(ttl=300)
+
+    def leer(session_db):
+        catalogo.invalidar()
+        return (CANCHA,)
+
+    catalogo._leer = leer
+    assert catalogo.todas() == (CANCHA,)
+    assert not catalogo._vigente()
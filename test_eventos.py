@@ -0,0 +1,68 @@
+"""Eventos SSE: la escucha de PostgreSQL se recupera de un corte"""
+import asyncio
+from datetime import date
+import asyncpg
+import eventos
+from eventos import DifusorEventos
+
+class ConexionFalsa:
+    def __init__(self):
+        self.cerrada = False
+        self._al_terminar = []
+        self.oyentes = {}
+
+    def add_termination_listener(self, funcion):
+        self._al_terminar.append(funcion)
+
+    async def add_listener(self, canal, funcion):
+        self.oyentes[canal] = funcion
+
+    async def fetchval(self, sql):
+        return 1
+
+    def is_closed(self):
+        return self.cerrada
+
+    def terminate(self):
+        self.cortar()
+
+    def cortar(self):
+        if not self.cerrada:
+            self.cerrada = True
+            for funcion in self._al_terminar:
+                funcion(self)
+
+def test_reconecta_y_pide_recargar(monkeypatch):
+    conexiones = []
+
+    async def conectar(dsn):
+        if len(conexiones) == 1:
+            conexiones.append(None)
+            raise OSError("base reiniciando")
+        conexion = ConexionFalsa()
+        conexiones.append(conexion)
+        return conexion
+
+    monkeypatch.setattr(asyncpg, 'connect', conectar)
+    monkeypatch.setattr(eventos, 'RECONEXION_ESPERA', 0.01)
+
+    async def escenario():
+        difusor = DifusorEventos()
+        cola = difusor.suscribir(date(2030, 1, 1))
+        await difusor.iniciar('postgresql://u:p@localhost/base')
+        while not conexiones:
+            await asyncio.sleep(0.01)
+        conexiones[0].cortar()
+        # Un intento fallido y después una conexión nueva, con su LISTEN
+        while len(conexiones) < 3 or difusor._conexion is None:
+            await asyncio.sleep(0.01)
+        evento = await asyncio.wait_for(cola.get(), 1)
+        assert eventos.CANAL in conexiones[2].oyentes
+        estadisticas = difusor.estadisticas()
+        await difusor.detener()
+        return evento, estadisticas, conexiones[2].cerrada
+
+    evento, estadisticas, cerrada = asyncio.run(asyncio.wait_for(escenario(), 10))
+    assert evento == {'tipo': 'recargar', 'fecha': '2030-01-01'}
+    assert estadisticas['reconexiones'] == 1
+    assert cerrada
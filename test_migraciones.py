@@ -0,0 +1,74 @@
+"""Migración 2: las reservas activas duplicadas se cancelan antes de crear el índice único"""
+from datetime import datetime
+from sqlalchemy import delete, insert, inspect, select
+
+def test_indice_unico_con_duplicados_previos(base):
+    from database import Cliente, Reserva, ResumenDiario, indice_horario_activo
+    from migraciones import NOTA_DUPLICADA, esquema_version, migrar
+    from resumen import reconstruir_resumen
+
+    turno = {'cancha_id': 1, 'fecha_reserva': datetime(2030, 3, 1), 'horario': '17:00 - 18:00',
+             'horas': 1, 'metodo_pago': 'efectivo', 'monto_total': 70000}
+    with base.engine.begin() as conexion:
+        # Base anterior a la migración 2: sin índice único y con un horario repetido
+        indice_horario_activo.drop(conexion)
+        conexion.execute(delete(esquema_version).where(esquema_version.c.version == 2))
+        cliente_id = conexion.execute(insert(Cliente).values(
+            cedula='1', nombre='Ana', apellido='Paz', telefono='0981', email=''
+        ).returning(Cliente.id)).scalar_one()
+        ids = [
+            conexion.execute(insert(Reserva).values(
+                cliente_id=cliente_id, estado=estado, notas=notas, **turno
+            ).returning(Reserva.id)).scalar_one()
+            for estado, notas in [('confirmada', None), ('pendiente', 'Llamar antes'), ('cancelada', None)]
+        ]
+        reconstruir_resumen(conexion)
+
+    migrar(base.engine)
+
+    with base.engine.connect() as conexion:
+        filas = {fila.id: fila for fila in conexion.execute(select(Reserva.id, Reserva.estado, Reserva.notas))}
+        nombres = {indice['name'] for indice in inspect(conexion).get_indexes('reservas')}
+        ocupados = conexion.scalar(select(ResumenDiario.horarios_ocupados).where(ResumenDiario.cancha_id == 1))
+    assert filas[ids[0]].estado == 'confirmada'
+    assert filas[ids[1]].estado == 'cancelada'
+    assert filas[ids[1]].notas == f"Llamar antes\n{NOTA_DUPLICADA}"
+    assert filas[ids[2]].notas is None
+    assert indice_horario_activo.name in nombres
+    assert ocupados == 1
+
+def test_horarios_con_escritura_vieja(cliente, base):
+    from database import Cliente, Reserva
+    from migraciones import esquema_version, migrar
+
+    fecha = datetime(2030, 3, 2)
+    turno = {'cancha_id': 1, 'fecha_reserva': fecha, 'horas': 1, 'metodo_pago': 'efectivo', 'monto_total': 70000}
+    with base.engine.begin() as conexion:
+        # Reservas de antes de normalizar: el índice único compara el texto y las deja pasar
+        conexion.execute(delete(esquema_version).where(esquema_version.c.version == 7))
+        cliente_id = conexion.execute(insert(Cliente).values(
+            cedula='1', nombre='Ana', apellido='Paz', telefono='0981', email=''
+        ).returning(Cliente.id)).scalar_one()
+        vieja, canonica, libre = [
+            conexion.execute(insert(Reserva).values(
+                cliente_id=cliente_id, estado='confirmada', horario=horario, **turno
+            ).returning(Reserva.id)).scalar_one()
+            for horario in ['17:00-18:00', '17:00 - 18:00', '18']
+        ]
+
+    migrar(base.engine)
+
+    with base.engine.connect() as conexion:
+        filas = {fila.id: fila for fila in conexion.execute(select(Reserva.id, Reserva.estado, Reserva.horario))}
+    assert (filas[vieja].estado, filas[vieja].horario) == ('confirmada', '17:00 - 18:00')
+    assert filas[canonica].estado == 'cancelada'
+    assert (filas[libre].estado, filas[libre].horario) == ('confirmada', '18:00 - 19:00')
+
+    # El turno sigue tomado para una reserva nueva escrita de cualquier forma
+    for horario in ['17:00 - 18:00', '18:00-19:00']:
+        respuesta = cliente.post('/reservar', json={
+            'nombre': 'Beto', 'apellido': 'Gil', 'cedula': '2', 'telefono': '0982', 'cancha_id': 1,
+            'horario': horario, 'fecha': fecha.date().isoformat(), 'metodo_pago': 'efectivo'
+        })
+        assert respuesta.status_code == 400
+        assert respuesta.json['error'] == 'Este horario ya está reservado'
@@ -0,0 +1,15 @@
+"""/reservar responde con el horario tal como se guardó"""
+from datetime import date
+import pytest
+
+@pytest.mark.parametrize('horario', ['17:00-18:00', ' 17:00 - 18:00 ', '17-18'])
+def test_respuesta_con_horario_normalizado(cliente, base, horario):
+    from database import Reserva
+    respuesta = cliente.post('/reservar', json={
+        'nombre': 'Ana', 'apellido': 'Paz', 'cedula': '100', 'telefono': '0981', 'cancha_id': 1,
+        'horario': horario, 'fecha': date.today().isoformat(), 'metodo_pago': 'efectivo'
+    })
+    assert respuesta.status_code == 200, respuesta.json
+    with base.Session() as session_db:
+        guardado = session_db.get(Reserva, respuesta.json['reserva_id']).horario
+    assert respuesta.json['detalles']['horario'] == guardado == '17:00 - 18:00'
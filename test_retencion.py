@@ -0,0 +1,27 @@
+"""Retención: nunca archiva reservas de hoy ni futuras"""
+from datetime import date
+import pytest
+
+def reservas(base):
+    from sqlalchemy import func, select
+    from database import Reserva
+    with base.Session() as session_db:
+        return session_db.scalar(select(func.count()).select_from(Reserva))
+
+def test_purgar_exige_valores_positivos(base):
+    from retencion import purgar_reservas_antiguas
+    for dias, lote in ((0, 10), (-1, 10), (30, 0)):
+        with pytest.raises(ValueError):
+            purgar_reservas_antiguas(dias, lote)
+
+@pytest.mark.parametrize('datos', [{'dias': 0}, {'dias': -5}, {'lote': 0}, {'dias': 'x'}])
+def test_endpoint_rechaza_parametros_invalidos(admin, base, datos):
+    admin.post('/reservar', json={
+        'nombre': 'Ana', 'apellido': 'Paz', 'cedula': '100', 'telefono': '0981', 'cancha_id': 1,
+        'horario': '17:00 - 18:00', 'fecha': date.today().isoformat(), 'metodo_pago': 'efectivo'
+    })
+    antes = reservas(base)
+    respuesta = admin.post('/admin/limpiar_reservas_antiguas', json=datos)
+    assert respuesta.status_code == 400
+    assert not respuesta.json['success']
+    assert reservas(base) == antes == 1
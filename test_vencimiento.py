@@ -0,0 +1,39 @@
+"""Vencimiento de pendientes: la nota se agrega y el TTL no puede ser cero"""
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import update
+
+def reserva_vieja(admin, base, notas=None, horario='17:00 - 18:00'):
+    from database import Reserva
+    respuesta = admin.post('/reservar', json={
+        'nombre': 'Ana', 'apellido': 'Paz', 'cedula': '100', 'telefono': '0981', 'cancha_id': 1,
+        'horario': horario, 'fecha': date.today().isoformat(), 'metodo_pago': 'efectivo'
+    })
+    reserva_id = respuesta.json['reserva_id']
+    with base.Session() as session_db:
+        session_db.execute(update(Reserva).where(Reserva.id == reserva_id).values(
+            notas=notas, fecha_creacion=datetime.now() - timedelta(days=1)
+        ))
+        session_db.commit()
+    return reserva_id
+
+def test_agrega_la_nota_sin_pisar(admin, base):
+    from database import Reserva
+    from vencimiento import NOTA_VENCIDA, vencer_pendientes
+    con_notas = reserva_vieja(admin, base, notas='Trae pelota', horario='17:00 - 18:00')
+    sin_notas = reserva_vieja(admin, base, horario='18:00 - 19:00')
+
+    assert vencer_pendientes(60)['vencidas'] == 2
+    with base.Session() as session_db:
+        assert session_db.get(Reserva, con_notas).notas == f"Trae pelota\n{NOTA_VENCIDA}"
+        assert session_db.get(Reserva, sin_notas).notas == NOTA_VENCIDA
+        assert session_db.get(Reserva, sin_notas).estado == 'cancelada'
+
+@pytest.mark.parametrize('ttl_minutos', [0, -10, 'x'])
+def test_endpoint_rechaza_ttl_invalido(admin, base, ttl_minutos):
+    from database import Reserva
+    reserva_id = reserva_vieja(admin, base)
+    respuesta = admin.post('/admin/vencer_pendientes', json={'ttl_minutos': ttl_minutos})
+    assert respuesta.status_code == 400
+    with base.Session() as session_db:
+        assert session_db.get(Reserva, reserva_id).estado == 'pendiente'
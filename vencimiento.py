@@ -0,0 +1,125 @@
+"""Vencimiento de las reservas pendientes que nunca se pagaron.
+
+Una reserva 'pendiente' ocupa su turno hasta que el administrador la
+confirma o la cancela. Las que siguen pendientes PENDIENTE_TTL_MINUTOS
+después de creadas se cancelan con un único UPDATE ... RETURNING; las
+filas devueltas alimentan registrar_cambios(), que ajusta el resumen,
+invalida cachés y versiones y avisa que el turno quedó libre. El motivo
+se agrega al final de las notas de la reserva.
+
+El vencimiento automático está desactivado por defecto, porque cancela
+reservas que antes quedaban pendientes sin límite. Se activa con
+VENCIMIENTO_INTERVALO (segundos entre pasadas, por ejemplo 60): entonces
+programar() las vence en un hilo del proceso. También se puede correr a
+mano, desde /admin/vencer_pendientes o desde cron:
+
+    python vencimiento.py --ttl 60
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+from sqlalchemy import func, select, update
+from database import Session, Reserva
+from cambios import Cambio, registrar_cambios
+from notificaciones import encolar_cambio_estado
+from tareas import cola_tareas
+
+# Minutos que una reserva puede quedar pendiente antes de cancelarse
+PENDIENTE_TTL_MINUTOS = int(os.environ.get('PENDIENTE_TTL_MINUTOS', 60))
+
+# Segundos entre pasadas del hilo programado (0, por defecto = no programar)
+VENCIMIENTO_INTERVALO = int(os.environ.get('VENCIMIENTO_INTERVALO', 0))
+
+NOTA_VENCIDA = 'Vencida: sin confirmar a tiempo'
+
+log = logging.getLogger('complejo.vencimiento')
+
+# Resultados de las últimas pasadas, para el panel de administración
+ultimas_pasadas = deque(maxlen=20)
+
+def consulta_vencimiento(limite):
+    """UPDATE que cancela las pendientes creadas antes de 'limite' y agrega
+    NOTA_VENCIDA a sus notas, sin pisar lo que ya tuvieran"""
+    return (
+        update(Reserva)
+        .where(Reserva.estado == 'pendiente', Reserva.fecha_creacion < limite)
+        .values(estado='cancelada', notas=func.coalesce(Reserva.notas + '\n', '') + NOTA_VENCIDA)
+        .returning(Reserva.id, Reserva.cancha_id, Reserva.fecha_reserva, Reserva.horario, Reserva.monto_total)
+    )
+
+def vencer_pendientes(ttl_minutos=PENDIENTE_TTL_MINUTOS):
+    """Cancela las reservas pendientes creadas hace más de 'ttl_minutos'.
+
+    Devuelve la cantidad vencida, el límite usado y la duración. Con
+    ttl_minutos < 1 vencería reservas recién creadas: lanza ValueError.
+    """
+    if ttl_minutos < 1:
+        raise ValueError("ttl_minutos debe ser al menos 1")
+    inicio = time.perf_counter()
+    session_db = Session()
+    try:
+        # fecha_creacion la pone la base: el límite se calcula con su reloj
+        limite = session_db.scalar(select(func.now())) - timedelta(minutes=ttl_minutos)
+        vencidas = session_db.execute(consulta_vencimiento(limite)).all()
+
+        registrar_cambios(session_db, [
+            Cambio(cancha_id, fecha_reserva, 'pendiente', 'cancelada', monto_total, horario, reserva_id)
+            for reserva_id, cancha_id, fecha_reserva, horario, monto_total in vencidas
+        ])
+        for reserva_id, *_ in vencidas:
+            encolar_cambio_estado(session_db, reserva_id, 'cancelada')
+        session_db.commit()
+    except Exception:
+        session_db.rollback()
+        raise
+    finally:
+        session_db.close()
+
+    resultado = {
+        'vencidas': len(vencidas),
+        'fecha_limite': limite,
+        'segundos': round(time.perf_counter() - inicio, 4)
+    }
+    ultimas_pasadas.append(resultado)
+    return resultado
+
+def _programado(intervalo, ttl_minutos, detener):
+    while not detener.wait(intervalo):
+        try:
+            resultado = vencer_pendientes(ttl_minutos)
+        except Exception:
+            log.exception("Falló el vencimiento de reservas pendientes")
+            continue
+        if resultado['vencidas']:
+            log.info("%d reservas pendientes vencidas en %.3f s", resultado['vencidas'], resultado['segundos'])
+
+def programar(intervalo=VENCIMIENTO_INTERVALO, ttl_minutos=PENDIENTE_TTL_MINUTOS):
+    """Vence las pendientes cada 'intervalo' segundos en un hilo; devuelve el
+    Event que lo detiene. Con varios procesos cada uno corre su pasada: el
+    UPDATE sólo toma filas aún pendientes, así que no se pisan."""
+    if intervalo > 0 and ttl_minutos < 1:
+        raise ValueError("ttl_minutos debe ser al menos 1")
+    detener = threading.Event()
+    if intervalo > 0:
+        threading.Thread(
+            target=_programado, args=(intervalo, ttl_minutos, detener), name='vencimiento', daemon=True
+        ).start()
+    return detener
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cancela las reservas pendientes vencidas")
+    parser.add_argument('--ttl', type=int, default=PENDIENTE_TTL_MINUTOS, help="minutos que puede quedar pendiente")
+    args = parser.parse_args()
+    if args.ttl < 1:
+        parser.error("--ttl debe ser al menos 1")
+
+    cola_tareas.iniciar()
+    resultado = vencer_pendientes(args.ttl)
+    # Los avisos a los clientes salen antes de terminar
+    cola_tareas.esperar_vacia(30)
+    print(f"✅ {resultado['vencidas']} reservas pendientes creadas antes de "
+          f"{resultado['fecha_limite'].strftime('%d/%m/%Y %H:%M')} vencidas en {resultado['segundos']}s")
@@ -0,0 +1,126 @@
+"""Versiones en memoria de lo que muestran las páginas públicas, para ETags.
+
+Cada (cancha_id, fecha) y cada reserva tiene un contador que las escrituras
+incrementan después del commit (cambios.py). Un ETag armado con esos
+contadores se puede comparar con If-None-Match sin consultar la base.
+
+Los contadores son por proceso y arrancan de cero: cada ETag lleva el token
+de arranque del proceso, así uno emitido por otro proceso o antes de un
+reinicio nunca coincide. En PostgreSQL las escrituras además avisan por
+NOTIFY en el canal CANAL, y escuchar() mantiene al día los contadores y
+la caché de disponibilidad de un proceso cuando escribe otro.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from select import select as esperar_lectura
+from sqlalchemy import func, select
+from cache import cache_disponibilidad, invalidar_disponibilidad
+
+# Canal de LISTEN/NOTIFY en PostgreSQL
+CANAL = 'versiones'
+
+# Escuchar las escrituras de otros procesos (sólo PostgreSQL)
+VERSIONES_ESCUCHA = os.environ.get('VERSIONES_ESCUCHA', '1') not in ('0', 'false', 'no')
+
+log = logging.getLogger('complejo.versiones')
+
+def _dia(fecha):
+    return fecha.date() if isinstance(fecha, datetime) else fecha
+
+class Versiones:
+    """Contadores por (cancha_id, fecha) y por reserva"""
+
+    def __init__(self):
+        self.arranque = uuid.uuid4().hex[:8]
+        self._dias = {}
+        self._reservas = {}
+        self._lock = threading.Lock()
+
+    def dia(self, cancha_id, fecha):
+        return self._dias.get((int(cancha_id), _dia(fecha)), 0)
+
+    def reserva(self, reserva_id):
+        return self._reservas.get(int(reserva_id), 0)
+
+    def incrementar(self, dias=(), reservas=()):
+        with self._lock:
+            for cancha_id, fecha in dias:
+                clave = (int(cancha_id), _dia(fecha))
+                self._dias[clave] = self._dias.get(clave, 0) + 1
+            for reserva_id in reservas:
+                self._reservas[int(reserva_id)] = self._reservas.get(int(reserva_id), 0) + 1
+
+    def estadisticas(self):
+        return {'arranque': self.arranque, 'dias': len(self._dias), 'reservas': len(self._reservas)}
+
+versiones = Versiones()
+
+def etag(*partes):
+    """ETag débil con el token de arranque y 'partes'"""
+    return '-'.join(str(parte) for parte in (versiones.arranque, *partes))
+
+def notificar(session_db, dias, reservas):
+    """En PostgreSQL, avisa a los demás procesos al confirmar la transacción"""
+    if session_db.get_bind().dialect.name != 'postgresql' or not (dias or reservas):
+        return
+    carga = json.dumps({
+        'd': [[int(cancha_id), _dia(fecha).isoformat()] for cancha_id, fecha in dias],
+        'r': [int(reserva_id) for reserva_id in reservas]
+    }, separators=(',', ':'))
+    # NOTIFY admite menos de 8000 bytes; ante un lote enorme, invalidar todo
+    if len(carga) > 7000:
+        carga = '*'
+    session_db.execute(select(func.pg_notify(CANAL, carga)))
+
+def _olvidar_todo():
+    """Invalida todos los ETags y toda la disponibilidad cacheada"""
+    versiones.arranque = uuid.uuid4().hex[:8]
+    cache_disponibilidad.limpiar()
+
+def _aplicar_aviso(carga):
+    if carga == '*':
+        # No se sabe qué cambió
+        _olvidar_todo()
+        return
+    datos = json.loads(carga)
+    dias = [(cancha_id, datetime.strptime(fecha, '%Y-%m-%d').date()) for cancha_id, fecha in datos['d']]
+    for cancha_id, fecha in dias:
+        invalidar_disponibilidad(cancha_id, fecha)
+    versiones.incrementar(dias=dias, reservas=datos['r'])
+
+def _escuchar(engine, detener):
+    while not detener.is_set():
+        conexion = None
+        try:
+            registro = engine.raw_connection()
+            # Conexión dedicada: fuera del pool mientras escucha
+            registro.detach()
+            conexion = registro.driver_connection
+            conexion.autocommit = True
+            conexion.cursor().execute(f"LISTEN {CANAL}")
+            # Lo que haya cambiado mientras no se escuchaba no se conoce
+            _olvidar_todo()
+            while not detener.is_set():
+                if esperar_lectura([conexion], [], [], 5) == ([], [], []):
+                    continue
+                conexion.poll()
+                while conexion.notifies:
+                    _aplicar_aviso(conexion.notifies.pop(0).payload)
+        except Exception:
+            log.exception("Escucha de versiones interrumpida; reintentando")
+            time.sleep(5)
+        finally:
+            if conexion is not None:
+                conexion.close()
+
+def escuchar(engine):
+    """Hilo que aplica los avisos de otros procesos; devuelve el Event que lo detiene"""
+    detener = threading.Event()
+    if engine.dialect.name == 'postgresql' and VERSIONES_ESCUCHA:
+        threading.Thread(target=_escuchar, args=(engine, detener), name='versiones', daemon=True).start()
+    return detener
@@ -1,11 +1,11 @@
-from database import Session, Cancha, Reserva
-from datetime import datetime, date
+from database import sesion_lectura
+from catalogo import catalogo_canchas
+from disponibilidad import consultar_ocupados
+from horarios import horarios_de, libres
+from datetime import datetime, date, timedelta
 import json
 
 class WhatsAppBotSimulado:
-    def __init__(self):
-        self.session = Session()
-    
     def procesar_mensaje(self, mensaje, numero_telefono):
         mensaje = mensaje.lower().strip()
         
@@ -38,7 +38,7 @@ class WhatsAppBotSimulado:
 • ℹ️ Más información"""
     
     def _obtener_precios(self):
-        canchas = self.session.query(Cancha).filter_by(activa=True).all()
+        canchas = catalogo_canchas.activas()
         
         respuesta = "🏟️ *PRECIOS DE CANCHAS*\n\n"
         for cancha in canchas:
@@ -53,22 +53,17 @@ class WhatsAppBotSimulado:
         hoy = date.today()
         disponibilidad = {}
         
-        canchas = self.session.query(Cancha).filter_by(activa=True).all()
-        horarios = ["17:00 - 18:00", "18:00 - 19:00", "19:00 - 20:00", 
-                   "20:00 - 21:00", "21:00 - 22:00", "22:00 - 23:00"]
+        canchas = catalogo_canchas.activas()
+        # Una sesión por consulta: el bot vive fuera de las peticiones de Flask.
+        # Sólo lee, así que va a la réplica si hay una al día
+        with sesion_lectura() as session_db:
+            ocupados = consultar_ocupados(session_db, hoy, hoy + timedelta(days=1))
         
         for cancha in canchas:
-            reservas_hoy = self.session.query(Reserva).filter(
-                Reserva.cancha_id == cancha.id,
-                Reserva.fecha_reserva >= hoy,
-                Reserva.fecha_reserva < hoy.replace(day=hoy.day + 1),
-                Reserva.estado.in_(['pendiente', 'confirmada'])
-            ).all()
-            
-            horarios_ocupados = [r.horario for r in reservas_hoy]
+            mascara_ocupados = ocupados.get((cancha.id, hoy), 0)
             disponibilidad[cancha.nombre] = {
-                'disponibles': [h for h in horarios if h not in horarios_ocupados],
-                'ocupados': horarios_ocupados
+                'disponibles': horarios_de(libres(mascara_ocupados)),
+                'ocupados': horarios_de(mascara_ocupados)
             }
         
         respuesta = "📅 *DISPONIBILIDAD HOY*\n\n"